@@ -1,14 +1,36 @@
+import copy
+import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import Callable, Optional
 from starlette.websockets import WebSocket
 
+from .connection import Outbox, encode_message
+from .scheduler import TimerHandle, scheduler
+from .state_sync import make_patch
+
 
 @dataclass
 class Player:
     name: str
     websocket: Optional[WebSocket] = None
     connected: bool = True
+    outbox: Optional[Outbox] = field(default=None, repr=False)
+    # Versioned state sync: client opted in to game_state_patch messages
+    delta_sync: bool = False
+    state_seq: int = 0
+    last_state: Optional[dict] = field(default=None, repr=False)
+
+    def reset_state_sync(self) -> None:
+        """Forget the last snapshot so the next state message is a full one."""
+        self.last_state = None
+
+
+@dataclass(frozen=True)
+class EvictionPolicy:
+    """When the reaper (see reaper.py) removes an instance. None disables a rule."""
+    idle_seconds: Optional[float] = 30 * 60  # no moves for this long, with someone disconnected
+    abandoned_seconds: Optional[float] = 60  # every player disconnected for this long
 
 
 class BaseGame(ABC):
@@ -16,11 +38,17 @@ class BaseGame(ABC):
     display_name: str  # e.g., "Rock Paper Scissors"
     min_players: int = 2
     max_players: int = 2
+    eviction: EvictionPolicy = EvictionPolicy()
 
     def __init__(self, instance_id: str):
         self.instance_id = instance_id
         self.players: list[Player] = []
         self.state: dict = {}
+        self._timers: dict[str, TimerHandle] = {}
+        self.dirty = True  # changed since the last snapshot (see snapshots.py)
+        self.last_activity = time.time()  # last move, rejoin or disconnect
+        self.abandoned_at: Optional[float] = None  # when the last player disconnected
+        self.closed = False  # removed (see close()); a move that awaited must not touch shared state
 
     @abstractmethod
     async def handle_move(self, player: Player, data: dict) -> None:
@@ -37,6 +65,65 @@ class BaseGame(ABC):
         """Reset game state for a new round."""
         pass
 
+    def close(self) -> None:
+        """Release anything held outside the instance. Called when the instance is removed."""
+        self.closed = True
+        self.cancel_scheduled()
+
+    def snapshot(self) -> dict:
+        """Everything needed to rebuild this instance after a restart. Must be JSON-serializable."""
+        return {
+            "game_id": self.game_id,
+            "players": [p.name for p in self.players],
+            "state": self.state,
+        }
+
+    def restore(self, data: dict) -> None:
+        """Rebuild from snapshot(). Players come back disconnected and rejoin."""
+        self.players = [Player(name=name, connected=False) for name in data["players"]]
+        self.state = data["state"]
+
+    def estimated_size(self) -> int:
+        """Rough memory footprint in bytes, for the reaper's memory budget."""
+        return len(encode_message(self.state))
+
+    def blob_digests(self) -> list[str]:
+        """image_store digests this instance holds, one entry per reference taken."""
+        return []
+
+    async def on_player_disconnected(self, player: Player) -> None:
+        """Called after a player's connection drops."""
+        pass
+
+    async def on_player_reconnected(self, player: Player) -> None:
+        """Called after a player rejoins, before the fresh game state is broadcast."""
+        pass
+
+    def schedule_at(self, name: str, when: float, callback: Callable, *args) -> TimerHandle:
+        """Schedule a named event for this instance, replacing any pending one with that name."""
+        self.cancel_scheduled(name)
+        handle = self._timers[name] = scheduler.call_at(when, self._run_scheduled, name, callback, args)
+        return handle
+
+    def schedule(self, name: str, delay: float, callback: Callable, *args) -> TimerHandle:
+        """Like schedule_at, `delay` seconds from now."""
+        return self.schedule_at(name, time.time() + delay, callback, *args)
+
+    def cancel_scheduled(self, name: Optional[str] = None) -> None:
+        """Cancel one named event, or all of this instance's events."""
+        names = [name] if name else list(self._timers)
+        for n in names:
+            handle = self._timers.pop(n, None)
+            if handle:
+                handle.cancel()
+
+    def is_scheduled(self, name: str) -> bool:
+        return name in self._timers
+
+    def _run_scheduled(self, name: str, callback: Callable, args: tuple):
+        self._timers.pop(name, None)
+        return callback(*args)
+
     def get_opponent(self, player: Player) -> Optional[Player]:
         """Get the opponent of the given player."""
         for p in self.players:
@@ -44,26 +131,53 @@ class BaseGame(ABC):
                 return p
         return None
 
+    def _enqueue(self, player: Player, text: str, state: bool = False) -> None:
+        """Hand an encoded message to the player's outbox; never waits on the socket."""
+        if player.connected and player.outbox:
+            if not player.outbox.put(text, state=state):
+                player.connected = False
+
     async def broadcast(self, message: dict, exclude: Optional[Player] = None) -> None:
         """Send message to all connected players except excluded one."""
+        text = None  # encoded once, on first use, and shared by every recipient
         for player in self.players:
-            if player.connected and player.websocket and player != exclude:
-                try:
-                    await player.websocket.send_json(message)
-                except Exception:
-                    player.connected = False
+            if player != exclude and player.connected and player.outbox:
+                text = text or encode_message(message)
+                self._enqueue(player, text)
 
     async def send_to(self, player: Player, message: dict) -> None:
         """Send message to specific player."""
-        if player.connected and player.websocket:
-            try:
-                await player.websocket.send_json(message)
-            except Exception:
-                player.connected = False
+        if player.connected and player.outbox:
+            self._enqueue(player, encode_message(message))
+
+    async def send_game_state(self, player: Player, full: bool = False) -> None:
+        """Send state to one player, as a patch against their last snapshot if they support it."""
+        state = self.get_game_state(player)
+        if not player.delta_sync:
+            self._enqueue(player, encode_message({"type": "game_state", "data": state}), state=True)
+            return
+
+        # A backed-up connection sheds its queued (now stale) states; the patch
+        # chain is broken then, so start over from a full snapshot
+        if player.outbox and player.outbox.backlogged and player.outbox.drop_states():
+            full = True
+
+        player.state_seq += 1
+        if full or player.last_state is None:
+            message = {"type": "game_state", "seq": player.state_seq, "data": state}
+        else:
+            message = {
+                "type": "game_state_patch",
+                "seq": player.state_seq,
+                "ops": make_patch(player.last_state, state),
+            }
+        # get_game_state may hand out live references into self.state
+        player.last_state = copy.deepcopy(state)
+        self._enqueue(player, encode_message(message), state=True)
 
     async def broadcast_game_state(self) -> None:
         """Send personalized game state to each player."""
+        self.dirty = True
         for player in self.players:
             if player.connected:
-                state = self.get_game_state(player)
-                await self.send_to(player, {"type": "game_state", "data": state})
+                await self.send_game_state(player)
@@ -0,0 +1,366 @@
+"""
+Multi-worker mode: several server processes, one owner per game instance.
+
+`WORKERS=N python main.py` runs a broker in the parent process and N uvicorn
+worker processes. Every worker listens on the public PORT (SO_REUSEPORT, so
+the kernel spreads new connections) and on its own port, PORT + 1 + index.
+
+- Each instance is owned by one worker, picked by consistent hashing of its
+  instance_id (HashRing). Any worker can work out the owner by itself, so a
+  rejoin that lands on the wrong worker just gets a `redirect` to the owner's port.
+- Matchmaking runs in the broker so players on different workers still pair
+  up. Workers forward tickets over a Unix socket (JSON lines). On a match the
+  broker has the owner create the instance with both players disconnected,
+  then tells each player's worker, which sends `matched` (with the owner's
+  port when it isn't local) and the client rejoins on the owner. If the owner
+  doesn't confirm within CREATE_TIMEOUT_SECONDS, or disconnects, both tickets
+  go back in the queue (unless their own worker is gone too).
+
+Broker protocol, worker -> broker:
+    {"op": "hello", "worker": 0}
+    {"op": "enqueue", "ticket": "0:17", "game_id": ..., "player_name": ...,
+     "invite_code": ..., "previous_opponent": ..., "rating": ...}
+    {"op": "cancel", "ticket": "0:17"}
+    {"op": "created", "instance_id": ...}
+broker -> worker:
+    {"op": "create", "instance_id": ..., "game_id": ..., "players": [name, name]}
+    {"op": "matched", "ticket": "0:17", "instance_id": ..., "opponent_name": ...}
+    {"op": "rejected", "ticket": "0:17"}  (that name is already waiting, see Matchmaker.enqueue)
+"""
+
+import asyncio
+import bisect
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from starlette.websockets import WebSocket
+
+from .base import Player
+from .matchmaking import Matchmaker, Ticket
+from .scheduler import TimerHandle, scheduler
+
+logger = logging.getLogger(__name__)
+
+VNODES = 64  # ring points per worker
+CREATE_TIMEOUT_SECONDS = float(os.getenv("CLUSTER_CREATE_TIMEOUT_SECONDS", 10))
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hashing of keys onto worker indexes."""
+
+    def __init__(self, nodes: int, vnodes: int = VNODES):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in range(nodes) for i in range(vnodes))
+        self._keys = [h for h, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key: str) -> int:
+        i = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[i]
+
+
+def worker_port(base_port: int, index: int) -> int:
+    return base_port + 1 + index
+
+
+def _encode(message: dict) -> bytes:
+    return json.dumps(message).encode() + b"\n"
+
+
+# --- Broker (parent process) ---
+
+def _ticket_worker(ticket: Ticket) -> int:
+    """The worker a broker-side ticket was queued from (keys are "worker:n")."""
+    return int(ticket.key.split(":")[0])
+
+
+@dataclass
+class _Creating:
+    """A match waiting for its owner's "created"."""
+    owner: int
+    tickets: tuple[Ticket, Ticket]
+    timeout: TimerHandle
+
+
+class Broker:
+    def __init__(self, workers: int):
+        self.ring = HashRing(workers)
+        self.matchmaker = Matchmaker(on_match=self._on_match)
+        self._writers: dict[int, asyncio.StreamWriter] = {}
+        self._worker_tickets: dict[int, set[str]] = {}
+        self._creating: dict[str, _Creating] = {}  # by instance_id
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve one worker's connection."""
+        worker = None
+        try:
+            while line := await reader.readline():
+                msg = json.loads(line)
+                op = msg.get("op")
+                if op == "hello":
+                    worker = msg["worker"]
+                    self._writers[worker] = writer
+                    self._worker_tickets[worker] = set()
+                    logger.info(f"Worker {worker} connected to broker")
+                elif op == "enqueue":
+                    queued = self.matchmaker.enqueue(Ticket(
+                        player=Player(name=msg["player_name"], connected=False),
+                        game_id=msg["game_id"],
+                        invite_code=msg.get("invite_code"),
+                        previous_opponent=msg.get("previous_opponent"),
+                        rating=msg.get("rating"),
+                        key=msg["ticket"],
+                    ))
+                    if queued:
+                        self._worker_tickets[worker].add(msg["ticket"])
+                    else:
+                        self._reject(worker, msg["ticket"])
+                elif op == "cancel":
+                    self._worker_tickets[worker].discard(msg["ticket"])
+                    self.matchmaker.cancel(msg["ticket"])
+                elif op == "created":
+                    self._notify_matched(msg["instance_id"])
+        finally:
+            if worker is not None:
+                logger.warning(f"Worker {worker} disconnected from broker")
+                self._writers.pop(worker, None)
+                for key in self._worker_tickets.pop(worker, ()):
+                    self.matchmaker.cancel(key)
+                # It will never confirm the instances it was creating
+                for instance_id in [i for i, creating in self._creating.items() if creating.owner == worker]:
+                    self._abandon_create(instance_id)
+
+    async def _on_match(self, game_id: str, first: Ticket, second: Ticket) -> None:
+        if not self._writers:
+            return
+        # Pick an id that hashes to a live worker (normally the first one does)
+        while True:
+            instance_id = str(uuid.uuid4())[:8]
+            owner = self.ring.node_for(instance_id)
+            if owner in self._writers:
+                break
+
+        timeout = scheduler.call_later(CREATE_TIMEOUT_SECONDS, self._abandon_create, instance_id)
+        self._creating[instance_id] = _Creating(owner, (first, second), timeout)
+        self._writers[owner].write(_encode({
+            "op": "create",
+            "instance_id": instance_id,
+            "game_id": game_id,
+            "players": [first.player.name, second.player.name],
+        }))
+
+    def _notify_matched(self, instance_id: str) -> None:
+        """The owner has the instance ready - tell both players' workers."""
+        creating = self._creating.pop(instance_id, None)
+        if creating is None:
+            return  # timed out; the owner reaps the empty instance
+        creating.timeout.cancel()
+        pair = creating.tickets
+        for ticket, opponent in (pair, pair[::-1]):
+            worker = _ticket_worker(ticket)
+            self._worker_tickets.get(worker, set()).discard(ticket.key)
+            writer = self._writers.get(worker)
+            if writer:
+                writer.write(_encode({
+                    "op": "matched",
+                    "ticket": ticket.key,
+                    "instance_id": instance_id,
+                    "opponent_name": opponent.player.name,
+                }))
+
+    def _abandon_create(self, instance_id: str) -> None:
+        """The owner didn't create the instance (timed out or disconnected) - queue both players again."""
+        creating = self._creating.pop(instance_id, None)
+        if creating is None:
+            return
+        creating.timeout.cancel()
+        logger.warning(f"Worker {creating.owner} did not create instance {instance_id}, re-queueing its players")
+        for ticket in creating.tickets:
+            worker = _ticket_worker(ticket)
+            if ticket.key not in self._worker_tickets.get(worker, ()):
+                continue  # cancelled meanwhile, or its worker is gone
+            if not self.matchmaker.enqueue(ticket):
+                self._reject(worker, ticket.key)
+
+    def _reject(self, worker: int, key: str) -> None:
+        """Tell a worker the broker won't queue one of its tickets."""
+        self._worker_tickets.get(worker, set()).discard(key)
+        writer = self._writers.get(worker)
+        if writer:
+            writer.write(_encode({"op": "rejected", "ticket": key}))
+
+
+def _listen(port: int, reuse_port: bool = False) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("0.0.0.0", port))
+    return sock
+
+
+def _run_worker(app: str, index: int, workers: int, port: int, socket_path: str) -> None:
+    """Worker process entry point: one uvicorn server on the shared and its own port."""
+    import uvicorn
+
+    os.environ.update(
+        PARLOR_WORKER_INDEX=str(index),
+        WORKERS=str(workers),
+        PORT=str(port),
+        PARLOR_BROKER_SOCKET=socket_path,
+    )
+    sockets = [_listen(port, reuse_port=True), _listen(worker_port(port, index))]
+    uvicorn.Server(uvicorn.Config(app)).run(sockets=sockets)
+
+
+async def _serve(app: str, port: int, workers: int, socket_path: str) -> None:
+    broker = Broker(workers)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(broker.handle, path=socket_path)
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_run_worker, args=(app, i, workers, port, socket_path), daemon=True)
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"Started {workers} workers on port {port} (own ports {worker_port(port, 0)}+)")
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+def run_cluster(app: str, port: int, workers: int) -> None:
+    """Run the broker and `workers` worker processes until interrupted."""
+    socket_path = os.getenv("PARLOR_BROKER_SOCKET", f"/tmp/parlor-{port}.sock")
+    try:
+        asyncio.run(_serve(app, port, workers, socket_path))
+    except KeyboardInterrupt:
+        pass
+
+
+# --- Worker side ---
+
+class ClusterNode:
+    """
+    A worker's view of the cluster: instance ownership plus a remote matchmaker.
+
+    Has the same enqueue()/cancel() interface as Matchmaker, so main.py uses
+    whichever one applies.
+    """
+
+    def __init__(self, index: int, workers: int, base_port: int, socket_path: str):
+        self.index = index
+        self.base_port = base_port
+        self.socket_path = socket_path
+        self.ring = HashRing(workers)
+        self._tickets: dict[str, Ticket] = {}  # ticket key -> local ticket
+        self._keys: dict[WebSocket, str] = {}
+        self._ids = itertools.count()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["ClusterNode"]:
+        """The node for this process, or None when not running as a cluster worker."""
+        index = os.getenv("PARLOR_WORKER_INDEX")
+        if index is None:
+            return None
+        return cls(int(index), int(os.environ["WORKERS"]), int(os.environ["PORT"]),
+                   os.environ["PARLOR_BROKER_SOCKET"])
+
+    def owns(self, instance_id: str) -> bool:
+        return self.ring.node_for(instance_id) == self.index
+
+    def port_for(self, instance_id: str) -> int:
+        """The private port of the worker owning an instance."""
+        return worker_port(self.base_port, self.ring.node_for(instance_id))
+
+    async def start(self,
+                    on_create: Callable[[str, str, list[str]], Awaitable],
+                    on_matched: Callable[[Ticket, str, str], Awaitable],
+                    on_rejected: Callable[[Ticket], Awaitable]) -> None:
+        """Connect to the broker and start handling its messages."""
+        reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+        self._post({"op": "hello", "worker": self.index})
+        self._task = asyncio.create_task(self._run(reader, on_create, on_matched, on_rejected))
+        logger.info(f"Worker {self.index} joined cluster")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+        if self._writer:
+            self._writer.close()
+
+    def enqueue(self, ticket: Ticket) -> bool:
+        """Queue a ticket with the broker. It may still refuse it (see the "rejected" op)."""
+        websocket = ticket.player.websocket
+        self.cancel(websocket)
+        key = f"{self.index}:{next(self._ids)}"
+        self._tickets[key] = ticket
+        self._keys[websocket] = key
+        self._post({
+            "op": "enqueue",
+            "ticket": key,
+            "game_id": ticket.game_id,
+            "player_name": ticket.player.name,
+            "invite_code": ticket.invite_code,
+            "previous_opponent": ticket.previous_opponent,
+            "rating": ticket.rating,
+        })
+        return True
+
+    def cancel(self, websocket: WebSocket) -> bool:
+        key = self._keys.pop(websocket, None)
+        if key is None:
+            return False
+        del self._tickets[key]
+        self._post({"op": "cancel", "ticket": key})
+        return True
+
+    def _post(self, message: dict) -> None:
+        if self._writer is None or self._writer.is_closing():
+            logger.warning(f"Broker unavailable, dropping {message['op']}")
+            return
+        self._writer.write(_encode(message))
+
+    async def _run(self, reader: asyncio.StreamReader, on_create, on_matched, on_rejected) -> None:
+        while line := await reader.readline():
+            msg = json.loads(line)
+            op = msg.get("op")
+            try:
+                if op == "create":
+                    await on_create(msg["instance_id"], msg["game_id"], msg["players"])
+                    self._post({"op": "created", "instance_id": msg["instance_id"]})
+                elif op == "matched":
+                    ticket = self._tickets.pop(msg["ticket"], None)
+                    if ticket is None:
+                        continue  # player left meanwhile; the instance times out on its own
+                    self._keys.pop(ticket.player.websocket, None)
+                    await on_matched(ticket, msg["instance_id"], msg["opponent_name"])
+                elif op == "rejected":
+                    ticket = self._tickets.pop(msg["ticket"], None)
+                    if ticket is None:
+                        continue
+                    self._keys.pop(ticket.player.websocket, None)
+                    await on_rejected(ticket)
+            except Exception:
+                logger.exception(f"Failed to handle broker message {op}")
+        logger.error("Lost connection to broker")
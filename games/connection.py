@@ -0,0 +1,129 @@
+"""
+Per-connection outbound message queues.
+
+Every WebSocket gets an Outbox drained by its own writer task, so game code
+only ever enqueues: a slow or half-dead socket backs up its own queue and
+never stalls the move handler or the other player.
+
+Overflow policy (see OutboxPolicy):
+- once a queue is backlogged, queued game_state messages are stale and get
+  dropped in favour of the newest one; events are always kept
+- a queue that stays backlogged for max_stall_seconds gets disconnected
+
+Messages are queued already encoded, so a broadcast is serialized once and
+the same string is written to every socket. orjson is used when installed.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from starlette.websockets import WebSocket
+
+try:
+    import orjson
+except ImportError:  # optional - the stdlib encoder works, just slower
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def encode_message(message: dict) -> str:
+    """Serialize an outbound message once, for one or many sockets."""
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+@dataclass
+class OutboxPolicy:
+    max_messages: int = 64  # queue length at which a connection counts as backlogged
+    max_stall_seconds: float = 10.0  # backlogged this long -> disconnect
+
+
+DEFAULT_POLICY = OutboxPolicy(
+    max_messages=int(os.getenv("OUTBOX_MAX_MESSAGES", 64)),
+    max_stall_seconds=float(os.getenv("OUTBOX_MAX_STALL_SECONDS", 10)),
+)
+
+
+class Outbox:
+    def __init__(self, websocket: WebSocket, policy: OutboxPolicy = DEFAULT_POLICY):
+        self.websocket = websocket
+        self.policy = policy
+        self.closed = False
+        self._queue: deque[tuple[bool, str]] = deque()  # (is_state, encoded message)
+        self._wakeup = asyncio.Event()
+        self._backlogged_since: Optional[float] = None
+        self._task = asyncio.create_task(self._run())
+
+    @property
+    def backlogged(self) -> bool:
+        return len(self._queue) >= self.policy.max_messages
+
+    def send(self, message: dict, state: bool = False) -> bool:
+        """Encode and queue a message meant for this socket only."""
+        return self.put(encode_message(message), state=state)
+
+    def put(self, text: str, state: bool = False) -> bool:
+        """Queue an encoded message. Returns False if the connection is closed or was just dropped."""
+        if self.closed:
+            return False
+
+        if self.backlogged:
+            if state:
+                self.drop_states()
+            now = time.monotonic()
+            if self._backlogged_since is None:
+                self._backlogged_since = now
+            elif now - self._backlogged_since > self.policy.max_stall_seconds:
+                logger.warning("Dropping connection after sustained backpressure")
+                self.abort()
+                return False
+
+        self._queue.append((state, text))
+        self._wakeup.set()
+        return True
+
+    def drop_states(self) -> int:
+        """Drop queued game_state messages (events stay). Returns how many were dropped."""
+        before = len(self._queue)
+        self._queue = deque(entry for entry in self._queue if not entry[0])
+        return before - len(self._queue)
+
+    def close(self) -> None:
+        """Stop the writer. Queued messages are discarded."""
+        self.closed = True
+        self._task.cancel()
+
+    def abort(self) -> None:
+        """Close the writer and the socket itself; the receive loop sees the disconnect."""
+        self.close()
+        asyncio.ensure_future(self._close_socket())
+
+    async def _close_socket(self) -> None:
+        try:
+            await self.websocket.close(code=1013, reason="Too slow")
+        except Exception:
+            pass
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self._queue:
+                    _, text = self._queue.popleft()
+                    await self.websocket.send_text(text)
+                    if not self.backlogged:
+                        self._backlogged_since = None
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Socket is gone; the receive loop handles the disconnect
+            self.closed = True
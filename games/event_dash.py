@@ -1,7 +1,9 @@
+import bisect
 import json
 import math
 import random
 import time
+from collections import OrderedDict, deque
 from pathlib import Path
 from typing import Optional
 from .base import BaseGame, Player
@@ -36,28 +38,53 @@ RADIUS_RANGES = [
     (1000000, 0.2, 0.6),      # Major cities
     (float('inf'), 0.3, 0.8)  # Mega cities
 ]
+_RADIUS_THRESHOLDS = [max_pop for max_pop, _, _ in RADIUS_RANGES]
+
+# US Census regions, for the "area" config option (a region name or a state code)
+REGIONS = {
+    "Northeast": {"CT", "ME", "MA", "NH", "RI", "VT", "NJ", "NY", "PA"},
+    "Midwest": {"IL", "IN", "MI", "OH", "WI", "IA", "KS", "MN", "MO", "NE", "ND", "SD"},
+    "South": {
+        "DE", "DC", "FL", "GA", "MD", "NC", "SC", "VA", "WV", "AL", "KY", "MS",
+        "TN", "AR", "LA", "OK", "TX",
+    },
+    "West": {
+        "AZ", "CO", "ID", "MT", "NV", "NM", "UT", "WY", "AK", "CA", "HI", "OR", "WA",
+    },
+}
+
+# Cities recently played by the same pair of players are avoided for this many draws
+RECENT_CITIES_PER_PAIR = 20
+MAX_TRACKED_PAIRS = 1024
+MAX_REDRAWS = 16
+
+
+CITIES_PATH = Path(__file__).parent.parent / "static" / "data" / "us_cities.json"
 
 
 def load_cities() -> list[dict]:
     """Load US cities from JSON file."""
-    cities_path = Path(__file__).parent.parent / "static" / "data" / "us_cities.json"
-    with open(cities_path) as f:
+    with open(CITIES_PATH) as f:
         return json.load(f)
 
 
 def get_radius_range(population: int) -> tuple[float, float]:
     """Get min/max radius in miles based on population."""
-    for max_pop, min_r, max_r in RADIUS_RANGES:
-        if population < max_pop:
-            return (min_r, max_r)
+    i = bisect.bisect_right(_RADIUS_THRESHOLDS, population)
+    if i < len(RADIUS_RANGES):
+        return RADIUS_RANGES[i][1:]
     return (2.0, 5.0)
 
 
-def random_point_in_radius(lat: float, lng: float, min_miles: float, max_miles: float) -> tuple[float, float]:
+def random_point_in_radius(lat: float, lng: float, min_miles: float, max_miles: float,
+                           cos_lat: Optional[float] = None) -> tuple[float, float]:
     """Generate a random point within a radius range from center."""
+    if cos_lat is None:
+        cos_lat = math.cos(math.radians(lat))
+
     # Convert miles to degrees (approximate)
     miles_per_degree_lat = 69.0
-    miles_per_degree_lng = 69.0 * math.cos(math.radians(lat))
+    miles_per_degree_lng = 69.0 * cos_lat
 
     # Random angle and distance
     angle = random.uniform(0, 2 * math.pi)
@@ -70,6 +97,127 @@ def random_point_in_radius(lat: float, lng: float, min_miles: float, max_miles:
     return (lat + delta_lat, lng + delta_lng)
 
 
+class City:
+    """One entry of the shared city index, with per-city values precomputed."""
+    __slots__ = ("name", "state", "lat", "lng", "population", "radius_range", "cos_lat", "payload")
+
+    def __init__(self, record: dict):
+        self.name = record["city"]
+        self.state = record["state"]
+        self.lat = record["lat"]
+        self.lng = record["lng"]
+        self.population = record["population"]
+        self.radius_range = get_radius_range(self.population)
+        self.cos_lat = math.cos(math.radians(self.lat))
+        # What goes into game state / to clients. Shared - never mutate it.
+        self.payload = record
+
+
+class AliasTable:
+    """Vose's alias method: O(n) build, O(1) weighted draws."""
+    __slots__ = ("prob", "alias")
+
+    def __init__(self, weights: list[float]):
+        n = len(weights)
+        total = sum(weights)
+        scaled = [w * n / total for w in weights] if total > 0 else [1.0] * n
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+
+    def sample(self) -> int:
+        i = random.randrange(len(self.prob))
+        return i if random.random() < self.prob[i] else self.alias[i]
+
+
+class CityGroup:
+    """Cities matching one area filter, with a population alias table over them."""
+    __slots__ = ("cities", "weighted")
+
+    def __init__(self, cities: list[City]):
+        self.cities = tuple(cities)
+        self.weighted = AliasTable([c.population for c in cities])
+
+    def draw(self, weighted: bool) -> City:
+        if weighted:
+            return self.cities[self.weighted.sample()]
+        return self.cities[random.randrange(len(self.cities))]
+
+
+class CityIndex:
+    """Immutable, process-wide view of us_cities.json shared by all Event Dash games."""
+
+    def __init__(self, records: list[dict]):
+        self.cities: tuple[City, ...] = tuple(City(r) for r in records)
+        self._by_key = {(c.name, c.state): c for c in self.cities}
+
+        # Prebuilt groups: all cities (None), per region and per state code
+        members: dict[Optional[str], list[City]] = {None: list(self.cities)}
+        for city in self.cities:
+            members.setdefault(city.state, []).append(city)
+            for region, states in REGIONS.items():
+                if city.state in states:
+                    members.setdefault(region, []).append(city)
+        self._groups = {area: CityGroup(cities) for area, cities in members.items()}
+
+    def has_area(self, area: Optional[str]) -> bool:
+        return area in self._groups
+
+    def draw(self, area: Optional[str] = None, weighted: bool = False,
+             exclude: Optional[deque] = None) -> City:
+        """Pick a random city, optionally population-weighted and avoiding `exclude`."""
+        group = self._groups.get(area) or self._groups[None]
+        city = group.draw(weighted)
+        # Rejection sampling keeps draws O(1) while the excluded set is small
+        if exclude and len(group.cities) > len(exclude):
+            for _ in range(MAX_REDRAWS):
+                if city not in exclude:
+                    break
+                city = group.draw(weighted)
+        return city
+
+    def lookup(self, payload: Optional[dict]) -> Optional[City]:
+        """Find the record for a city dict stored in game state."""
+        if not payload:
+            return None
+        return self._by_key.get((payload["city"], payload["state"]))
+
+
+_city_index: Optional[CityIndex] = None
+
+
+def get_city_index() -> CityIndex:
+    """Return the shared city index, loading it on first use."""
+    global _city_index
+    if _city_index is None:
+        _city_index = CityIndex(load_cities())
+    return _city_index
+
+
+# Recently played cities per pair of player names, oldest pairs evicted first
+_recent_cities: OrderedDict[frozenset, deque] = OrderedDict()
+
+
+def recent_cities_for(pair: frozenset) -> deque:
+    """Return (and mark as used) the recent-city history for a pair of players."""
+    recent = _recent_cities.get(pair)
+    if recent is None:
+        recent = _recent_cities[pair] = deque(maxlen=RECENT_CITIES_PER_PAIR)
+        if len(_recent_cities) > MAX_TRACKED_PAIRS:
+            _recent_cities.popitem(last=False)
+    else:
+        _recent_cities.move_to_end(pair)
+    return recent
+
+
 class EventDash(BaseGame):
     game_id = "event-dash"
     display_name = "Event Dash"
@@ -79,7 +227,6 @@ class EventDash(BaseGame):
 
     def __init__(self, instance_id: str):
         super().__init__(instance_id)
-        self.cities = load_cities()
         self.reset_for_rematch()
 
     def reset_for_rematch(self) -> None:
@@ -88,7 +235,9 @@ class EventDash(BaseGame):
             "phase": "lobby",  # lobby, countdown, playing, finished
             "config": {
                 "time_limit": self.DEFAULT_TIME_LIMIT,
-                "same_start": True
+                "same_start": True,
+                "area": None,  # None = anywhere, else a region name or state code
+                "weighted": False,  # pick bigger cities more often
             },
             "host_index": 0,  # Index of host player
             "city": None,
@@ -102,22 +251,26 @@ class EventDash(BaseGame):
         }
 
     def _new_city(self) -> None:
-        """Select a new random city."""
-        self.state["city"] = random.choice(self.cities)
+        """Select a new random city, avoiding ones this pair played recently."""
+        config = self.state["config"]
+        recent = recent_cities_for(frozenset(p.name for p in self.players))
+        city = get_city_index().draw(config["area"], config["weighted"], exclude=recent)
+        recent.append(city)
+        self.state["city"] = city.payload
         self._generate_start_locations()
 
     def _generate_start_locations(self) -> None:
         """Generate starting locations for players based on city and config."""
-        city = self.state["city"]
+        city = get_city_index().lookup(self.state["city"])
         if not city:
             return
 
-        min_r, max_r = get_radius_range(city["population"])
+        min_r, max_r = city.radius_range
 
         if self.state["config"]["same_start"]:
             # Same start location for both
             lat, lng = random_point_in_radius(
-                city["lat"], city["lng"], min_r, max_r
+                city.lat, city.lng, min_r, max_r, city.cos_lat
             )
             for player in self.players:
                 self.state["start_locations"][player.name] = {"lat": lat, "lng": lng}
@@ -125,7 +278,7 @@ class EventDash(BaseGame):
             # Different start locations
             for player in self.players:
                 lat, lng = random_point_in_radius(
-                    city["lat"], city["lng"], min_r, max_r
+                    city.lat, city.lng, min_r, max_r, city.cos_lat
                 )
                 self.state["start_locations"][player.name] = {"lat": lat, "lng": lng}
 
@@ -160,22 +313,44 @@ class EventDash(BaseGame):
 
     def _get_remaining_time(self) -> Optional[float]:
         """Get remaining time in seconds, accounting for doubled speed."""
-        if self.state["config"]["time_limit"] is None:
-            return None
-        if self.state["timer_started_at"] is None:
+        deadline = self._get_deadline()
+        if deadline is None:
             return self.state["config"]["time_limit"]
 
-        now = time.time()
-        elapsed = now - self.state["timer_started_at"]
+        rate = 2 if self.state["timer_doubled_at"] else 1
+        return max(0, (deadline - time.time()) * rate)
 
-        # If timer was doubled, account for 2x speed
-        if self.state["timer_doubled_at"]:
-            normal_elapsed = self.state["timer_doubled_at"] - self.state["timer_started_at"]
-            doubled_elapsed = (now - self.state["timer_doubled_at"]) * 2
-            elapsed = normal_elapsed + doubled_elapsed
+    def _get_deadline(self) -> Optional[float]:
+        """Wall-clock time the round ends at, accounting for doubled speed."""
+        limit = self.state["config"]["time_limit"]
+        started = self.state["timer_started_at"]
+        if limit is None or started is None:
+            return None
 
-        remaining = self.state["config"]["time_limit"] - elapsed
-        return max(0, remaining)
+        doubled = self.state["timer_doubled_at"]
+        if doubled:
+            # Whatever was left when the timer doubled runs out at 2x speed
+            return doubled + (limit - (doubled - started)) / 2
+        return started + limit
+
+    def _schedule_timer(self) -> None:
+        """(Re)arm the shared scheduler to end the round exactly at its deadline."""
+        deadline = self._get_deadline()
+        if deadline is None:
+            self.cancel_scheduled("round_end")
+        else:
+            self.schedule_at("round_end", deadline, self._on_timer_expired)
+
+    def restore(self, data: dict) -> None:
+        """Restore from a snapshot and re-arm the round timer (it may fire right away)."""
+        super().restore(data)
+        if self.state["phase"] == "playing":
+            self._schedule_timer()
+
+    async def _on_timer_expired(self) -> None:
+        """Round deadline reached - end it even if nobody is making moves."""
+        if self.state["phase"] == "playing":
+            await self._end_game()
 
     def _calculate_score(self, player_name: str) -> float:
         """Calculate total score for a player."""
@@ -236,8 +411,18 @@ class EventDash(BaseGame):
         if time_limit not in self.TIME_LIMITS:
             time_limit = self.DEFAULT_TIME_LIMIT
 
+        area = data.get("area")
+        if area is not None and (not isinstance(area, str) or not get_city_index().has_area(area)):
+            await self.send_to(player, {
+                "type": "error",
+                "message": "Unknown area"
+            })
+            return
+
         self.state["config"]["time_limit"] = time_limit
         self.state["config"]["same_start"] = bool(data.get("same_start", True))
+        self.state["config"]["area"] = area
+        self.state["config"]["weighted"] = bool(data.get("weighted", False))
 
         await self.broadcast({
             "type": "game_configured",
@@ -286,6 +471,7 @@ class EventDash(BaseGame):
         # After 3 seconds (handled by frontend), game will be in playing phase
         self.state["phase"] = "playing"
         self.state["timer_started_at"] = time.time()
+        self._schedule_timer()
 
         await self.broadcast_game_state()
 
@@ -387,6 +573,7 @@ class EventDash(BaseGame):
                 # If first to finish, double timer for opponent
                 if len(self.state["finished_players"]) == 1 and opponent:
                     self.state["timer_doubled_at"] = time.time()
+                    self._schedule_timer()
                     await self.send_to(opponent, {"type": "opponent_finished"})
 
         # Check if both finished
@@ -449,6 +636,7 @@ class EventDash(BaseGame):
             self.state["finished_players"] = []
             self.state["timer_started_at"] = time.time()
             self.state["timer_doubled_at"] = None
+            self._schedule_timer()
 
             await self.broadcast({
                 "type": "game_starting",
@@ -480,6 +668,7 @@ class EventDash(BaseGame):
             self.state["finished_players"] = []
             self.state["timer_started_at"] = time.time()
             self.state["timer_doubled_at"] = None
+            self._schedule_timer()
             self.state["skip_requested_by"] = None
             self.state["ready_for_next"] = []
 
@@ -511,6 +700,7 @@ class EventDash(BaseGame):
             self.state["finished_players"] = []
             self.state["timer_started_at"] = time.time()
             self.state["timer_doubled_at"] = None
+            self._schedule_timer()
             self.state["skip_requested_by"] = None
             self.state["ready_for_next"] = []
 
@@ -528,6 +718,7 @@ class EventDash(BaseGame):
 
     async def _end_game(self) -> None:
         """End the game and show results."""
+        self.cancel_scheduled("round_end")
         self.state["phase"] = "finished"
 
         # Calculate scores
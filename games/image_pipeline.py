@@ -0,0 +1,59 @@
+"""
+Upload pipeline for Image Reveal pictures.
+
+Decodes an uploaded image, bounds its resolution, re-encodes it as WebP and
+pre-cuts it into grid tiles so reveals can ship individual tiles. Everything
+here is blocking CPU work - call process_upload via asyncio.to_thread().
+"""
+
+import io
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+MAX_DIMENSION = 1024  # longest side after downscaling
+MAX_SOURCE_PIXELS = 40_000_000  # refuse anything bigger before decoding it
+ENCODE_FORMAT = "WEBP"
+ENCODE_QUALITY = 80
+CONTENT_TYPE = "image/webp"
+
+
+@dataclass
+class ProcessedImage:
+    width: int
+    height: int
+    image: bytes
+    tiles: list[list[bytes]]  # [row][col], encoded like `image`
+
+
+def _encode(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, ENCODE_FORMAT, quality=ENCODE_QUALITY, method=4)
+    return buf.getvalue()
+
+
+def process_upload(data: bytes, grid_size: int) -> ProcessedImage:
+    """Decode, downscale, re-encode and tile an image. Raises ValueError if unreadable."""
+    try:
+        img = Image.open(io.BytesIO(data))
+        if img.width * img.height > MAX_SOURCE_PIXELS:
+            raise ValueError("Image is too large")
+        img = ImageOps.exif_transpose(img)
+        img.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ValueError("Could not read image") from e
+
+    img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    img.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.Resampling.LANCZOS)
+    width, height = img.size
+
+    tiles = []
+    for r in range(grid_size):
+        top, bottom = round(r * height / grid_size), round((r + 1) * height / grid_size)
+        row = []
+        for c in range(grid_size):
+            left, right = round(c * width / grid_size), round((c + 1) * width / grid_size)
+            row.append(_encode(img.crop((left, top, max(right, left + 1), max(bottom, top + 1)))))
+        tiles.append(row)
+
+    return ProcessedImage(width=width, height=height, image=_encode(img), tiles=tiles)
@@ -1,6 +1,9 @@
+import asyncio
 import random
 from typing import Optional
 from .base import BaseGame, Player
+from .image_pipeline import CONTENT_TYPE, process_upload
+from .image_store import decode_data_url, image_store
 
 
 class ImageReveal(BaseGame):
@@ -16,9 +19,13 @@ class ImageReveal(BaseGame):
 
     def reset_for_rematch(self) -> None:
         """Reset entire game state for rematch."""
+        if self.state:
+            self._release_image()
         self.state = {
             "phase": "waiting_for_image",
-            "image_data": None,  # base64 data URL
+            "image_hash": None,  # digest in image_store (downscaled full image)
+            "image_size": None,  # [width, height] after downscaling
+            "tile_hashes": None,  # [row][col] digests of the pre-cut tiles
             "revealed_tiles": [],  # list of [row, col] pairs
             "current_hint": None,
             "current_guess": None,
@@ -31,6 +38,35 @@ class ImageReveal(BaseGame):
             "gave_up": None,  # player name who gave up, if any
         }
 
+    def close(self) -> None:
+        """Free the current image from the shared store."""
+        super().close()
+        self._release_image()
+
+    def blob_digests(self) -> list[str]:
+        digests = [self.state["image_hash"]] if self.state.get("image_hash") else []
+        for row in self.state.get("tile_hashes") or []:
+            digests.extend(row)
+        return digests
+
+    def estimated_size(self) -> int:
+        """State plus the uploaded image and its tiles."""
+        size = super().estimated_size()
+        for digest in set(self.blob_digests()):
+            blob = image_store.get(digest)
+            size += len(blob.data) if blob else 0
+        return size
+
+    def _release_image(self) -> None:
+        """Drop this instance's references to the current image and its tiles."""
+        image_store.release(self.state.get("image_hash"))
+        for row in self.state.get("tile_hashes") or []:
+            for digest in row:
+                image_store.release(digest)
+        self.state["image_hash"] = None
+        self.state["image_size"] = None
+        self.state["tile_hashes"] = None
+
     def _get_picker(self) -> Optional[Player]:
         if not self.players:
             return None
@@ -111,14 +147,35 @@ class ImageReveal(BaseGame):
             return
 
         image_data = data.get("image_data")
-        if not image_data or not image_data.startswith("data:image/"):
+        decoded = decode_data_url(image_data) if isinstance(image_data, str) else None
+        if not decoded:
             await self.send_to(player, {
                 "type": "error",
                 "message": "Invalid image data"
             })
             return
 
-        self.state["image_data"] = image_data
+        # Decoding/resizing is CPU heavy - keep it off the event loop
+        try:
+            processed = await asyncio.to_thread(process_upload, decoded[1], self.GRID_SIZE)
+        except ValueError as e:
+            await self.send_to(player, {
+                "type": "error",
+                "message": str(e)
+            })
+            return
+
+        # The instance may have been removed, or the round moved on, while we were
+        # processing; the image store refs below would then never be released
+        if self.closed or not self._is_picker(player) or self.state["phase"] != "waiting_for_image":
+            return
+
+        self.state["image_hash"] = image_store.put(processed.image, CONTENT_TYPE)
+        self.state["image_size"] = [processed.width, processed.height]
+        self.state["tile_hashes"] = [
+            [image_store.put(tile, CONTENT_TYPE) for tile in row]
+            for row in processed.tiles
+        ]
         self.state["phase"] = "writing_hint"
 
         await self.broadcast_game_state()
@@ -309,7 +366,7 @@ class ImageReveal(BaseGame):
 
         # Reset for new round
         self.state["phase"] = "waiting_for_image"
-        self.state["image_data"] = None
+        self._release_image()
         self.state["revealed_tiles"] = []
         self.state["current_hint"] = None
         self.state["current_guess"] = None
@@ -340,6 +397,13 @@ class ImageReveal(BaseGame):
         is_picker = self._is_picker(for_player)
         opponent = guesser if is_picker else picker
 
+        # The guesser only gets the tiles revealed so far, never the whole picture
+        show_full = is_picker or self.state["phase"] == "round_complete"
+        tile_hashes = self.state["tile_hashes"]
+        tiles = [
+            [r, c, tile_hashes[r][c]] for r, c in self.state["revealed_tiles"]
+        ] if tile_hashes and not show_full else []
+
         return {
             "phase": self.state["phase"],
             "my_role": "picker" if is_picker else "guesser",
@@ -348,7 +412,9 @@ class ImageReveal(BaseGame):
             "my_name": for_player.name,
             "opponent_name": opponent.name if opponent else None,
             "opponent_connected": opponent.connected if opponent else False,
-            "image_data": self.state["image_data"],
+            "image_hash": self.state["image_hash"] if show_full else None,
+            "image_size": self.state["image_size"],
+            "tiles": tiles,
             "revealed_tiles": self.state["revealed_tiles"],
             "grid_size": self.GRID_SIZE,
             "current_hint": self.state["current_hint"],
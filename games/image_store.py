@@ -0,0 +1,63 @@
+"""
+Content-addressed in-memory store for uploaded images.
+
+Images are stored once, keyed by a hash of their bytes, and served over
+HTTP (see /api/images/{digest} in main.py) so game_state messages only
+need to carry the digest. Entries are reference counted by the game
+instances using them and dropped when the last one releases.
+"""
+
+import base64
+import binascii
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+
+def decode_data_url(data_url: str) -> Optional[tuple[str, bytes]]:
+    """Split a base64 `data:image/...` URL into (content_type, bytes). None if malformed."""
+    header, sep, payload = data_url.partition(",")
+    if not sep or not header.startswith("data:image/") or not header.endswith(";base64"):
+        return None
+    try:
+        data = base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return header[len("data:"):-len(";base64")], data
+
+
+@dataclass
+class Blob:
+    content_type: str
+    data: bytes
+    refs: int = 0
+
+
+class BlobStore:
+    def __init__(self):
+        self._blobs: dict[str, Blob] = {}
+
+    def put(self, data: bytes, content_type: str) -> str:
+        """Store bytes (or add a reference to an identical blob) and return the digest."""
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        blob = self._blobs.get(digest)
+        if blob is None:
+            blob = self._blobs[digest] = Blob(content_type=content_type, data=data)
+        blob.refs += 1
+        return digest
+
+    def get(self, digest: str) -> Optional[Blob]:
+        return self._blobs.get(digest)
+
+    def release(self, digest: Optional[str]) -> None:
+        """Drop one reference; the blob is freed when none remain."""
+        blob = self._blobs.get(digest) if digest else None
+        if blob is None:
+            return
+        blob.refs -= 1
+        if blob.refs <= 0:
+            del self._blobs[digest]
+
+
+# Shared by every game instance in this process
+image_store = BlobStore()
@@ -0,0 +1,207 @@
+"""
+Matchmaking service.
+
+Each game type has its own MatchQueue. Joining only records a Ticket; pairing
+happens in a batched tick per game type, run on the shared scheduler shortly
+after new tickets arrive. Enqueue, dequeue and cancel are all O(1): waiting
+tickets live in OrderedDicts and dict indexes, never in lists that get scanned.
+
+Optional constraints on a ticket:
+- invite_code: only pairs with a ticket carrying the same code
+- previous_opponent: prefers pairing back up with that player (e.g. after the
+  old instance vanished); falls back to the open pool after REMATCH_WAIT_SECONDS
+- rating: rated tickets pair within the same or a neighbouring RATING_BAND
+
+Player names identify players within an instance (rejoin goes by name), so
+only one ticket per name waits for a game type at a time; enqueue() refuses
+a second one.
+"""
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Hashable, Optional
+
+from .base import Player
+from .scheduler import TimerHandle, scheduler
+
+logger = logging.getLogger(__name__)
+
+MATCH_TICK_SECONDS = float(os.getenv("MATCH_TICK_SECONDS", 0.05))
+REMATCH_WAIT_SECONDS = 15
+RATING_BAND = 200
+
+
+@dataclass(eq=False)
+class Ticket:
+    player: Player
+    game_id: str
+    invite_code: Optional[str] = None
+    previous_opponent: Optional[str] = None
+    rating: Optional[float] = None
+    key: Hashable = None  # identifies the ticket for cancel(); defaults to the player's websocket
+    enqueued_at: float = field(default_factory=time.time)
+    cancelled: bool = False
+    release_timer: Optional[TimerHandle] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.key is None:
+            self.key = self.player.websocket
+
+    @property
+    def band(self) -> Optional[int]:
+        return None if self.rating is None else int(self.rating // RATING_BAND)
+
+
+class MatchQueue:
+    """Waiting tickets for one game type."""
+
+    def __init__(self):
+        self.pending: list[Ticket] = []  # arrived since the last tick
+        self.open: dict[Optional[int], OrderedDict[Hashable, Ticket]] = {}  # band -> FIFO
+        self.invites: dict[str, Ticket] = {}  # invite code -> waiting ticket
+        self.rematches: dict[tuple[str, str], Ticket] = {}  # (name, wanted opponent) -> ticket
+
+    def match(self) -> list[tuple[Ticket, Ticket]]:
+        """Pair up pending tickets with waiting ones (or each other). Older ticket first."""
+        pairs = []
+        pending, self.pending = self.pending, []
+        for ticket in pending:
+            if ticket.cancelled:
+                continue
+            partner = self._take_partner(ticket)
+            if partner:
+                pairs.append((partner, ticket))
+            else:
+                self._index(ticket)
+        return pairs
+
+    def remove(self, ticket: Ticket) -> None:
+        """Drop a waiting ticket from whichever index holds it."""
+        if ticket.invite_code:
+            if self.invites.get(ticket.invite_code) is ticket:
+                del self.invites[ticket.invite_code]
+        elif ticket.previous_opponent:
+            key = (ticket.player.name, ticket.previous_opponent)
+            if self.rematches.get(key) is ticket:
+                del self.rematches[key]
+        else:
+            pool = self.open.get(ticket.band)
+            if pool and pool.get(ticket.key) is ticket:
+                del pool[ticket.key]
+
+    def _take_partner(self, ticket: Ticket) -> Optional[Ticket]:
+        if ticket.invite_code:
+            return self.invites.pop(ticket.invite_code, None)
+
+        if ticket.previous_opponent:
+            return self.rematches.pop((ticket.previous_opponent, ticket.player.name), None)
+
+        bands = [None] if ticket.band is None else [ticket.band, ticket.band - 1, ticket.band + 1]
+        for band in bands:
+            pool = self.open.get(band)
+            if pool:
+                return pool.popitem(last=False)[1]
+        return None
+
+    def _index(self, ticket: Ticket) -> None:
+        if ticket.invite_code:
+            self.invites[ticket.invite_code] = ticket
+        elif ticket.previous_opponent:
+            self.rematches[(ticket.player.name, ticket.previous_opponent)] = ticket
+        else:
+            self.open.setdefault(ticket.band, OrderedDict())[ticket.key] = ticket
+
+
+class Matchmaker:
+    def __init__(self, on_match: Callable[[str, Ticket, Ticket], Awaitable]):
+        self._on_match = on_match
+        self._queues: dict[str, MatchQueue] = {}
+        self._tickets: dict[Hashable, Ticket] = {}  # queue membership, by ticket key
+        self._names: dict[tuple[str, str], Hashable] = {}  # (game_id, player name) -> ticket key
+        self._counts: dict[str, int] = {}
+        self._ticks: dict[str, TimerHandle] = {}
+
+    def enqueue(self, ticket: Ticket) -> bool:
+        """Add a ticket; it is matched on the next tick for its game type.
+
+        False (and nothing queued) if someone with the same name is already waiting for it.
+        """
+        self.cancel(ticket.key)
+        name = (ticket.game_id, ticket.player.name)
+        if name in self._names:
+            return False
+        self._names[name] = ticket.key
+        self._tickets[ticket.key] = ticket
+        self._counts[ticket.game_id] = self._counts.get(ticket.game_id, 0) + 1
+        self._queue(ticket.game_id).pending.append(ticket)
+        self._schedule_tick(ticket.game_id)
+        return True
+
+    def cancel(self, key: Hashable) -> bool:
+        """Withdraw a ticket (by default keyed by its websocket), if it is queued."""
+        ticket = self._tickets.pop(key, None)
+        if ticket is None:
+            return False
+        ticket.cancelled = True  # tombstone for the pending list
+        self._queue(ticket.game_id).remove(ticket)
+        self._forget(ticket)
+        return True
+
+    def queue_length(self, game_id: str) -> int:
+        return self._counts.get(game_id, 0)
+
+    def _queue(self, game_id: str) -> MatchQueue:
+        queue = self._queues.get(game_id)
+        if queue is None:
+            queue = self._queues[game_id] = MatchQueue()
+        return queue
+
+    def _forget(self, ticket: Ticket) -> None:
+        self._counts[ticket.game_id] -= 1
+        del self._names[(ticket.game_id, ticket.player.name)]
+        if ticket.release_timer:
+            ticket.release_timer.cancel()
+            ticket.release_timer = None
+
+    def _schedule_tick(self, game_id: str) -> None:
+        tick = self._ticks.get(game_id)
+        if tick is None or tick.cancelled:
+            self._ticks[game_id] = scheduler.call_later(MATCH_TICK_SECONDS, self._tick, game_id)
+
+    async def _tick(self, game_id: str) -> None:
+        """Run one batched matching pass for a game type."""
+        self._ticks.pop(game_id, None)
+        queue = self._queue(game_id)
+        for first, second in queue.match():
+            # An earlier _on_match may have awaited long enough for either to be cancelled
+            live = [ticket for ticket in (first, second) if self._tickets.get(ticket.key) is ticket]
+            if len(live) < 2:
+                for ticket in live:
+                    queue.pending.append(ticket)  # its partner left, match it again
+                    self._schedule_tick(game_id)
+                continue
+            for ticket in live:
+                self._tickets.pop(ticket.key, None)
+                self._forget(ticket)
+            await self._on_match(game_id, first, second)
+
+        # Rematch preferences don't wait forever
+        for ticket in queue.rematches.values():
+            if ticket.release_timer is None:
+                ticket.release_timer = scheduler.call_later(
+                    REMATCH_WAIT_SECONDS, self._release_preference, ticket
+                )
+
+    def _release_preference(self, ticket: Ticket) -> None:
+        """Previous opponent never showed up - let the ticket match anyone."""
+        ticket.release_timer = None
+        if ticket.cancelled or self._tickets.get(ticket.key) is not ticket:
+            return
+        queue = self._queue(ticket.game_id)
+        queue.remove(ticket)
+        ticket.previous_opponent = None
+        queue.pending.append(ticket)
+        self._schedule_tick(ticket.game_id)
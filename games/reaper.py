@@ -0,0 +1,155 @@
+"""
+Instance reaper: one place that decides when game instances go away.
+
+Replaces a sleeping cleanup task per abandoned instance. The reaper keeps a
+heap of (deadline, instance_id) and arms a single shared-scheduler timer for
+the earliest one. Deadlines are lazy: activity only updates timestamps on the
+game, and an entry that comes due early is re-checked and pushed back rather
+than evicting.
+
+An instance is evicted when (per its game class's EvictionPolicy):
+- nobody made a move for idle_seconds while someone was disconnected (e.g. one
+  player vanished, the other idles); a round with everyone connected can run
+  as long as it likes
+- all players have been disconnected for abandoned_seconds
+- the estimated size of all instances exceeds INSTANCE_MEMORY_BUDGET_MB; then
+  abandoned instances go first, then the least recently active
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Iterable, Optional
+
+from .base import BaseGame
+from .scheduler import TimerHandle, scheduler
+
+logger = logging.getLogger(__name__)
+
+MEMORY_BUDGET_BYTES = int(float(os.getenv("INSTANCE_MEMORY_BUDGET_MB", 256)) * 1024 * 1024)
+BUDGET_CHECK_SECONDS = 30
+
+
+class Reaper:
+    def __init__(self):
+        self._heap: list[tuple[float, int, str]] = []
+        self._due: dict[str, float] = {}  # instance_id -> its live heap entry's deadline
+        self._counter = itertools.count()
+        self._timer: Optional[TimerHandle] = None
+        self._next_budget_check = 0.0
+        self._lookup: Optional[Callable[[str], Optional[BaseGame]]] = None
+        self._games: Optional[Callable[[], Iterable[BaseGame]]] = None
+        self._on_evict: Optional[Callable[[BaseGame, str], Awaitable]] = None
+        self.evicted: Counter = Counter()  # reason -> count
+        self.estimated_bytes = 0  # as of the last budget check
+
+    def start(self,
+              lookup: Callable[[str], Optional[BaseGame]],
+              games: Callable[[], Iterable[BaseGame]],
+              on_evict: Callable[[BaseGame, str], Awaitable]) -> None:
+        self._lookup = lookup
+        self._games = games
+        self._on_evict = on_evict
+        self._next_budget_check = time.time() + BUDGET_CHECK_SECONDS
+        self._arm()
+
+    def stop(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def watch(self, game: BaseGame) -> None:
+        """Track an instance, or pick up a deadline that moved earlier (e.g. it was just abandoned)."""
+        when = self._deadline(game)[0]
+        if when < self._due.get(game.instance_id, float("inf")):
+            self._push(game.instance_id, when)
+
+    def stats(self) -> dict:
+        live = Counter(game.game_id for game in self._games()) if self._games else Counter()
+        return {
+            "live": sum(live.values()),
+            "live_by_game": dict(live),
+            "evicted": dict(self.evicted),
+            "estimated_bytes": self.estimated_bytes,
+            "memory_budget_bytes": MEMORY_BUDGET_BYTES,
+        }
+
+    @staticmethod
+    def _deadline(game: BaseGame) -> tuple[float, str]:
+        policy = game.eviction
+        deadlines = [(float("inf"), "")]
+        if policy.idle_seconds is not None and any(not p.connected for p in game.players):
+            deadlines.append((game.last_activity + policy.idle_seconds, "idle"))
+        if policy.abandoned_seconds is not None and game.abandoned_at is not None:
+            deadlines.append((game.abandoned_at + policy.abandoned_seconds, "abandoned"))
+        return min(deadlines)
+
+    def _push(self, instance_id: str, when: float) -> None:
+        self._due[instance_id] = when
+        heapq.heappush(self._heap, (when, next(self._counter), instance_id))
+        if self._timer is None or when < self._timer.when:
+            self._arm()
+
+    def _arm(self) -> None:
+        """Point the single timer at the next deadline or budget check."""
+        if self._timer:
+            self._timer.cancel()
+        when = self._next_budget_check
+        if self._heap:
+            when = min(when, self._heap[0][0])
+        self._timer = scheduler.call_at(when, self._run)
+
+    async def _run(self) -> None:
+        self._timer = None
+        now = time.time()
+        try:
+            while self._heap and self._heap[0][0] <= now:
+                when, _, instance_id = heapq.heappop(self._heap)
+                if self._due.get(instance_id) != when:
+                    continue  # superseded by an earlier entry, or already gone
+                del self._due[instance_id]
+
+                game = self._lookup(instance_id)
+                if game is None:
+                    continue
+                deadline, reason = self._deadline(game)
+                if deadline > now:
+                    if deadline != float("inf"):
+                        self._push(instance_id, deadline)  # saw activity since - check again later
+                    continue
+                await self._evict(game, reason)
+
+            if now >= self._next_budget_check:
+                self._next_budget_check = now + BUDGET_CHECK_SECONDS
+                await self._enforce_budget()
+        except Exception:
+            logger.exception("Reaper pass failed")
+        finally:
+            self._arm()
+
+    async def _enforce_budget(self) -> None:
+        """Evict abandoned, then least recently active, instances until under budget."""
+        sizes = [(game, game.estimated_size()) for game in self._games()]
+        self.estimated_bytes = sum(size for _, size in sizes)
+        if self.estimated_bytes <= MEMORY_BUDGET_BYTES:
+            return
+
+        sizes.sort(key=lambda entry: (entry[0].abandoned_at is None, entry[0].last_activity))
+        for game, size in sizes:
+            if self.estimated_bytes <= MEMORY_BUDGET_BYTES:
+                break
+            await self._evict(game, "memory")
+            self.estimated_bytes -= size
+
+    async def _evict(self, game: BaseGame, reason: str) -> None:
+        self._due.pop(game.instance_id, None)
+        self.evicted[reason] += 1
+        logger.info(f"Evicting game instance {game.instance_id} ({reason})")
+        await self._on_evict(game, reason)
+
+
+# Watches every game instance in this process
+reaper = Reaper()
@@ -0,0 +1,66 @@
+"""
+Connection registry: constant-time indexes over live games, players and connections.
+
+main.py keeps one ConnectionRegistry. Every lookup on the WebSocket hot path
+(move, rejoin, disconnect) is a dict access rather than a scan of players or
+instances. Waiting players live in the Matchmaker (see matchmaking.py).
+"""
+
+from typing import Iterator, Optional
+
+from starlette.websockets import WebSocket
+
+from .base import BaseGame, Player
+
+
+class ConnectionRegistry:
+    def __init__(self):
+        self._games: dict[str, BaseGame] = {}  # instance_id -> game
+        # (instance_id, name) -> player; names are unique per instance, see Matchmaker.enqueue
+        self._players: dict[tuple[str, str], Player] = {}
+        self._connections: dict[WebSocket, tuple[BaseGame, Player]] = {}
+
+    # --- Game instances ---
+
+    def add_game(self, game: BaseGame) -> None:
+        """Register a game and index its players and their connections."""
+        self._games[game.instance_id] = game
+        for player in game.players:
+            self._players[(game.instance_id, player.name)] = player
+            if player.websocket:
+                self.bind(player.websocket, game, player)
+
+    def remove_game(self, instance_id: str) -> Optional[BaseGame]:
+        """Unregister a game and everything indexed under it."""
+        game = self._games.pop(instance_id, None)
+        if game is None:
+            return None
+        for player in game.players:
+            self._players.pop((instance_id, player.name), None)
+            if player.websocket and self._connections.get(player.websocket, (None,))[0] is game:
+                del self._connections[player.websocket]
+        return game
+
+    def get_game(self, instance_id: str) -> Optional[BaseGame]:
+        return self._games.get(instance_id)
+
+    def games(self) -> Iterator[BaseGame]:
+        return iter(list(self._games.values()))
+
+    def game_count(self) -> int:
+        return len(self._games)
+
+    def find_player(self, instance_id: str, name: str) -> Optional[Player]:
+        return self._players.get((instance_id, name))
+
+    # --- Connections ---
+
+    def bind(self, websocket: WebSocket, game: BaseGame, player: Player) -> None:
+        self._connections[websocket] = (game, player)
+
+    def unbind(self, websocket: WebSocket) -> Optional[tuple[BaseGame, Player]]:
+        return self._connections.pop(websocket, None)
+
+    def lookup(self, websocket: WebSocket) -> Optional[tuple[BaseGame, Player]]:
+        """The game and player a connection belongs to, if any."""
+        return self._connections.get(websocket)
@@ -1,4 +1,3 @@
-import asyncio
 from typing import Optional
 from .base import BaseGame, Player
 
@@ -13,6 +12,7 @@ class RockPaperScissors(BaseGame):
         "paper": "rock",
         "scissors": "paper",
     }
+    REVEAL_SECONDS = 3  # how long the reveal shows before the next round
 
     def __init__(self, instance_id: str):
         super().__init__(instance_id)
@@ -20,6 +20,7 @@ class RockPaperScissors(BaseGame):
 
     def reset_for_rematch(self) -> None:
         """Reset for a new round (not full game reset)."""
+        self.cancel_scheduled("next_round")
         self.state = {
             "phase": "choosing",
             "choices": {},  # player_name -> choice
@@ -97,14 +98,27 @@ class RockPaperScissors(BaseGame):
             "scores": self.state["scores"].copy(),
         })
 
-        # Wait 3 seconds then start next round
-        await asyncio.sleep(3)
+        # Next round starts after the reveal, without holding up this move
+        self.schedule("next_round", self.REVEAL_SECONDS, self._start_next_round)
 
-        # Start next round
+    async def _start_next_round(self) -> None:
+        """Scheduled after a reveal: move on to the next round."""
+        if self.state["phase"] != "reveal":
+            return
         self.reset_for_rematch()
         await self.broadcast({"type": "new_round", "round": self.state["round"]})
         await self.broadcast_game_state()
 
+    async def on_player_disconnected(self, player: Player) -> None:
+        """Don't advance past a reveal the disconnected player hasn't finished seeing."""
+        self.cancel_scheduled("next_round")
+
+    async def on_player_reconnected(self, player: Player) -> None:
+        """Resume a reveal that was paused by a disconnect."""
+        if (self.state["phase"] == "reveal" and not self.is_scheduled("next_round")
+                and all(p.connected for p in self.players)):
+            self.schedule("next_round", self.REVEAL_SECONDS, self._start_next_round)
+
     def get_game_state(self, for_player: Player) -> dict:
         """Return game state from this player's perspective."""
         self._init_player_score(for_player)
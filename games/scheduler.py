@@ -0,0 +1,101 @@
+"""
+Shared deadline scheduler for game timers.
+
+Every game instance in the process schedules onto one heap of timers.
+Only a single loop.call_at() is armed at a time, for the earliest
+deadline - no polling and no asyncio.Task per game. Deadlines are
+wall-clock (time.time()) seconds, the same clock game state uses.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TimerHandle:
+    __slots__ = ("when", "callback", "args", "cancelled")
+
+    def __init__(self, when: float, callback: Callable, args: tuple):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        """Cancel the timer. Safe to call more than once or after it fired."""
+        self.cancelled = True
+
+
+class Scheduler:
+    def __init__(self):
+        self._heap: list[tuple[float, int, TimerHandle]] = []
+        self._counter = itertools.count()
+        self._armed: Optional[asyncio.TimerHandle] = None
+        self._armed_for: Optional[float] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def call_at(self, when: float, callback: Callable, *args: Any) -> TimerHandle:
+        """Run callback(*args) at wall-clock time `when`. Coroutine functions are awaited in a task."""
+        handle = TimerHandle(when, callback, args)
+        heapq.heappush(self._heap, (when, next(self._counter), handle))
+        if self._armed_for is None or when < self._armed_for:
+            self._arm()
+        return handle
+
+    def call_later(self, delay: float, callback: Callable, *args: Any) -> TimerHandle:
+        """Run callback(*args) after `delay` seconds."""
+        return self.call_at(time.time() + delay, callback, *args)
+
+    def pending(self) -> int:
+        """Number of scheduled, not yet cancelled timers."""
+        return sum(1 for _, _, h in self._heap if not h.cancelled)
+
+    def _arm(self) -> None:
+        """(Re)arm the single loop timer for the earliest live deadline."""
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+
+        if self._armed:
+            self._armed.cancel()
+            self._armed = None
+            self._armed_for = None
+        if not self._heap:
+            return
+
+        loop = asyncio.get_running_loop()
+        when = self._heap[0][0]
+        self._armed_for = when
+        self._armed = loop.call_at(loop.time() + max(0.0, when - time.time()), self._fire)
+
+    def _fire(self) -> None:
+        self._armed = None
+        self._armed_for = None
+        now = time.time()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, handle = heapq.heappop(self._heap)
+            if handle.cancelled:
+                continue
+            handle.cancelled = True  # fired - later cancel() calls are no-ops
+            try:
+                result = handle.callback(*handle.args)
+                if asyncio.iscoroutine(result):
+                    task = asyncio.ensure_future(result)
+                    self._tasks.add(task)
+                    task.add_done_callback(self._task_done)
+            except Exception:
+                logger.exception("Scheduled callback failed")
+        self._arm()
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error("Scheduled task failed", exc_info=task.exception())
+
+
+# Shared by every game instance in this process
+scheduler = Scheduler()
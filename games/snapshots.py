@@ -0,0 +1,201 @@
+"""
+Snapshots of live game instances, so restarts and deploys don't drop matches.
+
+Every SNAPSHOT_INTERVAL seconds, instances that changed since their last
+snapshot (BaseGame.dirty) are written to SQLite; on shutdown, all dirty ones
+are. A row is zlib-compressed JSON of BaseGame.snapshot(). Image store blobs
+an instance references are kept in snapshot_blobs and only written when the
+set of digests changes - they are content addressed, so an unchanged image is
+never rewritten.
+
+Nothing is rebuilt at startup: main.py restores an instance the first time a
+player tries to rejoin it.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from typing import Callable, Iterable, Optional
+
+from .base import BaseGame
+from .connection import encode_message
+from .image_store import image_store
+from .scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DB_PATH = os.getenv("SNAPSHOT_DB_PATH", os.path.join("data", "snapshots.db"))
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", 10))
+SNAPSHOT_MAX_AGE = 3600  # seconds; older snapshots are dropped at startup
+
+
+class SnapshotStore:
+    def __init__(self, path: str = SNAPSHOT_DB_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._available: set[str] = set()  # instance ids with a snapshot on disk
+        self._blob_sets: dict[str, frozenset[str]] = {}  # instance id -> digests on disk
+        self._games: Optional[Callable[[], Iterable[BaseGame]]] = None
+        self._lock = asyncio.Lock()
+
+    def open(self) -> None:
+        """Open the database and index (not load) the snapshots left by the last run."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")  # shared by workers in cluster mode
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                instance_id TEXT PRIMARY KEY,
+                game_id     TEXT NOT NULL,
+                saved_at    REAL NOT NULL,
+                data        BLOB NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS snapshot_blobs (
+                instance_id  TEXT NOT NULL,
+                digest       TEXT NOT NULL,
+                content_type TEXT NOT NULL,
+                data         BLOB NOT NULL,
+                PRIMARY KEY (instance_id, digest)
+            )
+        """)
+        with self._conn:
+            cutoff = time.time() - SNAPSHOT_MAX_AGE
+            self._conn.execute(
+                "DELETE FROM snapshot_blobs WHERE instance_id IN "
+                "(SELECT instance_id FROM snapshots WHERE saved_at < ?)", (cutoff,)
+            )
+            self._conn.execute("DELETE FROM snapshots WHERE saved_at < ?", (cutoff,))
+        self._available = {row[0] for row in self._conn.execute("SELECT instance_id FROM snapshots")}
+        if self._available:
+            logger.info(f"{len(self._available)} game snapshots available for restore")
+
+    def start(self, games: Callable[[], Iterable[BaseGame]]) -> None:
+        """Begin periodic snapshots of the instances `games()` returns."""
+        self._games = games
+        scheduler.call_later(SNAPSHOT_INTERVAL, self._tick)
+
+    async def close(self) -> None:
+        """Write every dirty instance (shutdown), then close the database."""
+        if self._conn is None:
+            return
+        if self._games:
+            await self.save_dirty(self._games())
+        self._conn.close()
+        self._conn = None
+
+    def has(self, instance_id: str) -> bool:
+        return instance_id in self._available
+
+    async def load(self, instance_id: str, game_classes: dict[str, type[BaseGame]]) -> Optional[BaseGame]:
+        """Rebuild an instance from its snapshot, or None if there isn't a usable one."""
+        if not self.has(instance_id):
+            return None
+        row, blobs = await asyncio.to_thread(self._read, instance_id)
+        if row is None:
+            self._available.discard(instance_id)
+            return None
+
+        game_id, data = row
+        data = json.loads(zlib.decompress(data))
+        game = game_classes[game_id](instance_id)
+        game.restore(data)
+
+        # Take the image store references the instance held before the restart
+        for digest in game.blob_digests():
+            if digest not in blobs:
+                logger.warning(f"Snapshot of {instance_id} is missing blob {digest}")
+                continue
+            content_type, blob = blobs[digest]
+            image_store.put(blob, content_type)
+
+        self._blob_sets[instance_id] = frozenset(blobs)
+        game.dirty = False
+        logger.info(f"Restored game instance {instance_id} from snapshot")
+        return game
+
+    async def delete(self, instance_id: str) -> None:
+        """Forget an instance that was cleaned up."""
+        self._blob_sets.pop(instance_id, None)
+        self._available.discard(instance_id)
+        if self._conn is not None:
+            async with self._lock:
+                await asyncio.to_thread(self._delete, instance_id)
+
+    async def save_dirty(self, games: Iterable[BaseGame]) -> int:
+        """Snapshot the instances that changed since last time. Returns how many."""
+        # Encode on the event loop (state may change under us otherwise); write off it
+        rows = [self._encode(game) for game in games if game.dirty]
+        if rows:
+            async with self._lock:
+                await asyncio.to_thread(self._write, rows)
+        return len(rows)
+
+    async def _tick(self) -> None:
+        try:
+            if self._conn is not None:
+                await self.save_dirty(self._games())
+        except Exception:
+            logger.exception("Snapshot pass failed")
+        finally:
+            if self._conn is not None:
+                scheduler.call_later(SNAPSHOT_INTERVAL, self._tick)
+
+    def _encode(self, game: BaseGame) -> tuple:
+        game.dirty = False
+        data = zlib.compress(encode_message(game.snapshot()).encode())
+
+        digests = frozenset(game.blob_digests())
+        blobs = None  # None = blob rows on disk are already right
+        if digests != self._blob_sets.get(game.instance_id):
+            self._blob_sets[game.instance_id] = digests
+            blobs = []
+            for digest in digests:
+                blob = image_store.get(digest)
+                if blob:
+                    blobs.append((digest, blob.content_type, blob.data))
+
+        self._available.add(game.instance_id)
+        return game.instance_id, game.game_id, time.time(), data, blobs
+
+    def _write(self, rows: list[tuple]) -> None:
+        with self._conn:
+            for instance_id, game_id, saved_at, data, blobs in rows:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO snapshots (instance_id, game_id, saved_at, data) VALUES (?, ?, ?, ?)",
+                    (instance_id, game_id, saved_at, data),
+                )
+                if blobs is None:
+                    continue
+                self._conn.execute("DELETE FROM snapshot_blobs WHERE instance_id = ?", (instance_id,))
+                self._conn.executemany(
+                    "INSERT INTO snapshot_blobs (instance_id, digest, content_type, data) VALUES (?, ?, ?, ?)",
+                    [(instance_id, *blob) for blob in blobs],
+                )
+
+    def _read(self, instance_id: str) -> tuple[Optional[tuple], dict[str, tuple[str, bytes]]]:
+        row = self._conn.execute(
+            "SELECT game_id, data FROM snapshots WHERE instance_id = ?", (instance_id,)
+        ).fetchone()
+        blobs = {
+            digest: (content_type, data)
+            for digest, content_type, data in self._conn.execute(
+                "SELECT digest, content_type, data FROM snapshot_blobs WHERE instance_id = ?", (instance_id,)
+            )
+        }
+        return row, blobs
+
+    def _delete(self, instance_id: str) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM snapshots WHERE instance_id = ?", (instance_id,))
+            self._conn.execute("DELETE FROM snapshot_blobs WHERE instance_id = ?", (instance_id,))
+
+
+# Shared by every game instance in this process
+snapshot_store = SnapshotStore()
@@ -0,0 +1,90 @@
+"""
+JSON-patch style diffs between successive game_state snapshots.
+
+Only the subset of RFC 6902 the client needs is produced: "add", "remove"
+and "replace". Lists that only grew at the end (chat, revealed tiles) are
+sent as appends; any other list change replaces the list wholesale.
+"""
+
+from typing import Any
+
+
+def _escape(key: str) -> str:
+    """Escape a dict key for use as a JSON pointer segment (RFC 6901)."""
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(segment: str) -> str:
+    return segment.replace("~1", "/").replace("~0", "~")
+
+
+def _same(a: Any, b: Any) -> bool:
+    """Equality that doesn't treat 1 / 1.0 / True as interchangeable."""
+    return type(a) is type(b) and a == b
+
+
+def _diff(old: Any, new: Any, path: str, ops: list[dict]) -> None:
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                _diff(old[key], value, child, ops)
+        return
+
+    if isinstance(old, list) and isinstance(new, list):
+        n = len(old)
+        if len(new) == n:
+            for i in range(n):
+                _diff(old[i], new[i], f"{path}/{i}", ops)
+            return
+        if len(new) > n and all(_same(a, b) for a, b in zip(old, new)):
+            for value in new[n:]:
+                ops.append({"op": "add", "path": f"{path}/-", "value": value})
+            return
+        ops.append({"op": "replace", "path": path, "value": new})
+        return
+
+    if not _same(old, new):
+        ops.append({"op": "replace", "path": path, "value": new})
+
+
+def make_patch(old: dict, new: dict) -> list[dict]:
+    """Return the ops that turn `old` into `new`."""
+    ops: list[dict] = []
+    _diff(old, new, "", ops)
+    return ops
+
+
+def apply_patch(doc: Any, ops: list[dict]) -> Any:
+    """Apply ops produced by make_patch to `doc` in place and return the result."""
+    for op in ops:
+        path = op["path"]
+        if path == "":
+            doc = op.get("value")
+            continue
+
+        segments = [_unescape(s) for s in path.split("/")[1:]]
+        target = doc
+        for segment in segments[:-1]:
+            target = target[int(segment)] if isinstance(target, list) else target[segment]
+        last = segments[-1]
+
+        if isinstance(target, list):
+            if op["op"] == "remove":
+                del target[int(last)]
+            elif last == "-":
+                target.append(op["value"])
+            elif op["op"] == "add":
+                target.insert(int(last), op["value"])
+            else:
+                target[int(last)] = op["value"]
+        elif op["op"] == "remove":
+            del target[last]
+        else:
+            target[last] = op["value"]
+    return doc
@@ -1,5 +1,5 @@
-import asyncio
 import os
+import time
 import uuid
 import logging
 from contextlib import asynccontextmanager
@@ -12,13 +12,20 @@ load_dotenv()
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 
 from games.base import BaseGame, Player
+from games.connection import Outbox
 from games.rps import RockPaperScissors
 from games.image_reveal import ImageReveal
 from games.event_dash import EventDash
-from persistence import init_db, close_db, router as persistence_router
+from games.image_store import image_store
+from games.registry import ConnectionRegistry
+from games.matchmaking import Matchmaker, Ticket
+from games.cluster import ClusterNode, run_cluster
+from games.snapshots import snapshot_store
+from games.reaper import reaper
+from persistence import init_db, close_db, start_maintenance, router as persistence_router
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,30 +38,32 @@ GAME_REGISTRY: dict[str, type[BaseGame]] = {
     "event-dash": EventDash,
 }
 
-# Active game instances: instance_id -> BaseGame
-game_instances: dict[str, BaseGame] = {}
-
-# Matchmaking queues: game_id -> list of (player_name, websocket)
-waiting_queues: dict[str, list[tuple[str, WebSocket]]] = {}
-
-# Map websocket to game instance for easy lookup
-websocket_to_game: dict[WebSocket, BaseGame] = {}
-
-# Cleanup tasks for disconnected games
-cleanup_tasks: dict[str, asyncio.Task] = {}
+# Active game instances, players and connections
+registry = ConnectionRegistry()
 
+# Set when running as one of several worker processes (WORKERS > 1, see games/cluster.py)
+cluster = ClusterNode.from_env()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler."""
     logger.info("Parlor starting up...")
     init_db()
+    start_maintenance()
+    # Snapshots from the last run are restored lazily, on first rejoin
+    snapshot_store.open()
+    snapshot_store.start(registry.games)
+    reaper.start(lookup=registry.get_game, games=registry.games, on_evict=evict_instance)
+    if cluster:
+        await cluster.start(on_create=create_cluster_instance, on_matched=join_cluster_match,
+                            on_rejected=reject_cluster_ticket)
     yield
     logger.info("Parlor shutting down...")
+    if cluster:
+        await cluster.stop()
+    reaper.stop()
+    await snapshot_store.close()
     close_db()
-    # Cancel any pending cleanup tasks
-    for task in cleanup_tasks.values():
-        task.cancel()
 
 
 app = FastAPI(title="Parlor", lifespan=lifespan)
@@ -133,6 +142,26 @@ async def solo_game(request: Request, game_id: str):
     })
 
 
+@app.get("/api/images/{digest}")
+async def get_image(request: Request, digest: str):
+    """Serve an uploaded image by content hash. Immutable, so clients cache it forever."""
+    blob = image_store.get(digest)
+    if blob is None:
+        return Response(status_code=404)
+
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(blob.data, media_type=blob.content_type, headers=headers)
+
+
+@app.get("/api/instances")
+async def instance_stats():
+    """Live game instances and how many the reaper evicted, by reason."""
+    return reaper.stats()
+
+
 # --- WebSocket Routes ---
 
 @app.websocket("/ws/game/{game_id}")
@@ -145,215 +174,267 @@ async def game_websocket(websocket: WebSocket, game_id: str):
     await websocket.accept()
     logger.info(f"WebSocket connected for game: {game_id}")
 
+    # All outbound traffic for this socket goes through its own queue + writer task
+    outbox = Outbox(websocket)
+
     player: Optional[Player] = None
-    game: Optional[BaseGame] = None
 
     try:
         while True:
             data = await websocket.receive_json()
             msg_type = data.get("type")
+            delta_sync = data.get("state_sync") == "delta"
 
             if msg_type == "join":
                 player_name = data.get("player_name", "").strip()
                 if not player_name:
-                    await websocket.send_json({
+                    outbox.send({
                         "type": "error",
                         "message": "Player name required"
                     })
                     continue
 
-                player = Player(name=player_name, websocket=websocket)
+                player = Player(name=player_name, websocket=websocket, outbox=outbox, delta_sync=delta_sync)
                 logger.info(f"Player '{player_name}' joining {game_id}")
 
                 # Try matchmaking
-                game = await try_matchmaking(game_id, player)
+                await try_matchmaking(game_id, player, data)
 
             elif msg_type == "rejoin":
                 instance_id = data.get("instance_id")
                 player_name = data.get("player_name", "").strip()
 
                 if not instance_id or not player_name:
-                    await websocket.send_json({
+                    outbox.send({
                         "type": "error",
                         "message": "Instance ID and player name required for rejoin"
                     })
                     continue
 
+                # Instance lives on another worker - send the client there
+                if cluster and not cluster.owns(instance_id):
+                    outbox.send({
+                        "type": "redirect",
+                        "instance_id": instance_id,
+                        "port": cluster.port_for(instance_id),
+                    })
+                    continue
+
                 # Try to rejoin existing game
-                game = await try_rejoin(instance_id, player_name, websocket)
+                game = await try_rejoin(instance_id, player_name, websocket, outbox, delta_sync)
 
                 if game:
-                    # Find the player in the game
-                    for p in game.players:
-                        if p.name == player_name:
-                            player = p
-                            break
+                    player = registry.find_player(instance_id, player_name)
                 else:
                     # Game not found or player not in it - treat as new join
-                    player = Player(name=player_name, websocket=websocket)
-                    game = await try_matchmaking(game_id, player)
+                    # (prefers pairing back up with the previous opponent, if the client sent one)
+                    player = Player(name=player_name, websocket=websocket, outbox=outbox, delta_sync=delta_sync)
+                    await try_matchmaking(game_id, player, data)
 
             elif msg_type == "move":
-                # Look up game from websocket mapping (handles case where first player's
+                # Look up game from the registry (handles case where first player's
                 # local game variable is None after being matched by second player)
-                current_game = websocket_to_game.get(websocket)
-                if not current_game:
-                    await websocket.send_json({
+                entry = registry.lookup(websocket)
+                if not entry:
+                    outbox.send({
                         "type": "error",
                         "message": "Not in a game"
                     })
                     continue
 
-                # Find the player object in the game
-                current_player = None
-                for p in current_game.players:
-                    if p.websocket == websocket:
-                        current_player = p
-                        break
-
-                if not current_player:
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": "Player not found in game"
-                    })
-                    continue
-
+                current_game, current_player = entry
+                current_game.last_activity = time.time()
                 await current_game.handle_move(current_player, data.get("data", {}))
 
+            elif msg_type == "sync_request":
+                # Client missed a state patch - resend a full snapshot
+                entry = registry.lookup(websocket)
+                if entry:
+                    current_game, current_player = entry
+                    await current_game.send_game_state(current_player, full=True)
+
             else:
-                await websocket.send_json({
+                outbox.send({
                     "type": "error",
                     "message": f"Unknown message type: {msg_type}"
                 })
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected: {player.name if player else 'unknown'}")
-        await handle_disconnect(player, game, websocket)
+        await handle_disconnect(websocket)
+    finally:
+        outbox.close()
+
 
+def make_ticket(game_id: str, player: Player, data: dict) -> Ticket:
+    """Build a matchmaking ticket from the optional constraints on a join/rejoin message."""
+    invite_code = data.get("invite_code")
+    invite_code = invite_code.strip().upper()[:32] if isinstance(invite_code, str) else ""
 
-async def try_matchmaking(game_id: str, player: Player) -> Optional[BaseGame]:
-    """Try to match player with opponent or add to queue."""
-    # Initialize queue for this game if needed
-    if game_id not in waiting_queues:
-        waiting_queues[game_id] = []
+    previous_opponent = data.get("previous_opponent")
+    previous_opponent = previous_opponent.strip() if isinstance(previous_opponent, str) else ""
 
-    queue = waiting_queues[game_id]
+    rating = data.get("rating")
+    if isinstance(rating, bool) or not isinstance(rating, (int, float)):
+        rating = None
 
-    # Check if there's someone waiting
-    if queue:
-        # Match found!
-        opponent_name, opponent_ws = queue.pop(0)
-        opponent = Player(name=opponent_name, websocket=opponent_ws)
+    return Ticket(
+        player=player,
+        game_id=game_id,
+        invite_code=invite_code or None,
+        previous_opponent=previous_opponent or None,
+        rating=rating,
+    )
+
+
+async def try_matchmaking(game_id: str, player: Player, data: dict) -> None:
+    """Queue the player; the matchmaker pairs them on its next tick for this game."""
+    if not matchmaker.enqueue(make_ticket(game_id, player, data)):
+        send_name_taken(player)
+        return
+    player.outbox.send({
+        "type": "waiting",
+        "message": "Waiting for opponent..."
+    })
+    logger.info(f"Player '{player.name}' added to {game_id} queue")
 
-        # Create game instance
-        instance_id = str(uuid.uuid4())[:8]
-        game_class = GAME_REGISTRY[game_id]
-        game = game_class(instance_id)
-        game.players = [opponent, player]
 
-        game_instances[instance_id] = game
+async def start_match(game_id: str, first: Player, second: Player) -> BaseGame:
+    """Create a game instance for two matched players."""
+    instance_id = str(uuid.uuid4())[:8]
+    game_class = GAME_REGISTRY[game_id]
+    game = game_class(instance_id)
+    game.players = [first, second]
+
+    add_instance(game)
+
+    logger.info(f"Match created: {first.name} vs {second.name} (instance: {instance_id})")
+
+    # Notify both players
+    await game.send_to(first, {
+        "type": "matched",
+        "instance_id": instance_id,
+        "opponent_name": second.name,
+    })
+    await game.send_to(second, {
+        "type": "matched",
+        "instance_id": instance_id,
+        "opponent_name": first.name,
+    })
+
+    # Send initial game state
+    await game.broadcast_game_state()
 
-        # Map both websockets to this game for easy lookup
-        websocket_to_game[opponent_ws] = game
-        websocket_to_game[player.websocket] = game
+    return game
 
-        logger.info(f"Match created: {opponent.name} vs {player.name} (instance: {instance_id})")
 
-        # Notify both players
-        await opponent.websocket.send_json({
-            "type": "matched",
-            "instance_id": instance_id,
-            "opponent_name": player.name,
-        })
-        await player.websocket.send_json({
-            "type": "matched",
-            "instance_id": instance_id,
-            "opponent_name": opponent.name,
-        })
+async def create_cluster_instance(instance_id: str, game_id: str, player_names: list[str]) -> None:
+    """Cluster mode: create an instance this worker owns. Both players arrive by rejoining."""
+    game = GAME_REGISTRY[game_id](instance_id)
+    game.players = [Player(name=name, connected=False) for name in player_names]
+    game.abandoned_at = time.time()  # until someone shows up
+    add_instance(game)
+    logger.info(f"Match created: {' vs '.join(player_names)} (instance: {instance_id})")
 
-        # Send initial game state
-        await game.broadcast_game_state()
 
-        return game
+async def join_cluster_match(ticket: Ticket, instance_id: str, opponent_name: str) -> None:
+    """Cluster mode: the broker matched a player queued on this worker."""
+    player = ticket.player
+    message = {
+        "type": "matched",
+        "instance_id": instance_id,
+        "opponent_name": opponent_name,
+    }
+    if cluster.owns(instance_id):
+        player.outbox.send(message)
+        await try_rejoin(instance_id, player.name, player.websocket, player.outbox, player.delta_sync)
     else:
-        # No one waiting - add to queue
-        queue.append((player.name, player.websocket))
-        await player.websocket.send_json({
-            "type": "waiting",
-            "message": "Waiting for opponent..."
-        })
-        logger.info(f"Player '{player.name}' added to {game_id} queue")
-        return None
+        # The client reconnects to the owner and rejoins there
+        message["port"] = cluster.port_for(instance_id)
+        player.outbox.send(message)
+
 
+async def reject_cluster_ticket(ticket: Ticket) -> None:
+    """Cluster mode: the broker refused a ticket queued on this worker."""
+    send_name_taken(ticket.player)
 
-async def try_rejoin(instance_id: str, player_name: str, websocket: WebSocket) -> Optional[BaseGame]:
+
+def send_name_taken(player: Player) -> None:
+    player.outbox.send({
+        "type": "error",
+        "message": f"Someone named '{player.name}' is already waiting for this game, pick another name"
+    })
+
+
+# Waiting players, per game type (held by the broker in cluster mode)
+matchmaker = cluster or Matchmaker(
+    on_match=lambda game_id, first, second: start_match(game_id, first.player, second.player)
+)
+
+
+async def try_rejoin(instance_id: str, player_name: str, websocket: WebSocket,
+                     outbox: Outbox, delta_sync: bool = False) -> Optional[BaseGame]:
     """Try to rejoin an existing game instance."""
-    if instance_id not in game_instances:
+    game = registry.get_game(instance_id) or await restore_instance(instance_id)
+    if not game:
         logger.info(f"Rejoin failed: instance {instance_id} not found")
         return None
 
-    game = game_instances[instance_id]
-
     # Find disconnected player with matching name
-    for player in game.players:
-        if player.name == player_name and not player.connected:
-            # Reconnect!
-            player.websocket = websocket
-            player.connected = True
+    player = registry.find_player(instance_id, player_name)
+    if not player or player.connected:
+        logger.info(f"Rejoin failed: player {player_name} not found in instance {instance_id}")
+        return None
 
-            # Add to websocket mapping
-            websocket_to_game[websocket] = game
+    # Reconnect!
+    player.websocket = websocket
+    player.outbox = outbox
+    player.connected = True
+    player.delta_sync = delta_sync
+    player.reset_state_sync()
+    registry.bind(websocket, game, player)
 
-            logger.info(f"Player '{player_name}' reconnected to instance {instance_id}")
+    logger.info(f"Player '{player_name}' reconnected to instance {instance_id}")
 
-            # Cancel cleanup task if exists
-            if instance_id in cleanup_tasks:
-                cleanup_tasks[instance_id].cancel()
-                del cleanup_tasks[instance_id]
+    # No longer abandoned (the reaper re-checks its stale deadline lazily)
+    game.abandoned_at = None
+    game.last_activity = time.time()
 
-            # Notify opponent
-            opponent = game.get_opponent(player)
-            if opponent and opponent.connected:
-                await game.send_to(opponent, {"type": "opponent_reconnected"})
+    await game.on_player_reconnected(player)
 
-            # Send current game state
-            await game.send_to(player, {
-                "type": "rejoined",
-                "instance_id": instance_id,
-                "opponent_name": opponent.name if opponent else None,
-            })
-            await game.broadcast_game_state()
+    # Notify opponent
+    opponent = game.get_opponent(player)
+    if opponent and opponent.connected:
+        await game.send_to(opponent, {"type": "opponent_reconnected"})
 
-            return game
+    # Send current game state
+    await game.send_to(player, {
+        "type": "rejoined",
+        "instance_id": instance_id,
+        "opponent_name": opponent.name if opponent else None,
+    })
+    await game.broadcast_game_state()
 
-    logger.info(f"Rejoin failed: player {player_name} not found in instance {instance_id}")
-    return None
+    return game
 
 
-async def handle_disconnect(player: Optional[Player], game: Optional[BaseGame], websocket: WebSocket = None) -> None:
-    """Handle player disconnection."""
-    if not player:
+async def handle_disconnect(websocket: WebSocket) -> None:
+    """Handle a closed connection: leave the queue or mark the player disconnected."""
+    if matchmaker.cancel(websocket):
         return
 
-    # Remove from websocket mapping
-    ws = websocket or player.websocket
-    if ws and ws in websocket_to_game:
-        del websocket_to_game[ws]
-
-    # Check if player was in matchmaking queue
-    for game_id, queue in waiting_queues.items():
-        queue[:] = [(name, ws) for name, ws in queue if ws != player.websocket]
-
-    # Look up game from mapping if not provided
-    if not game and ws:
-        game = websocket_to_game.get(ws)
-
-    if not game:
+    entry = registry.unbind(websocket)
+    if not entry:
         return
+    game, player = entry
 
     # Mark player as disconnected
     player.connected = False
     player.websocket = None
+    player.outbox = None
+    await game.on_player_disconnected(player)
+    # The idle rule only applies while someone is away, so its clock starts now
+    game.last_activity = time.time()
 
     # Notify opponent
     opponent = game.get_opponent(player)
@@ -364,38 +445,52 @@ async def handle_disconnect(player: Optional[Player], game: Optional[BaseGame],
     all_disconnected = all(not p.connected for p in game.players)
 
     if all_disconnected:
-        # Schedule cleanup
-        instance_id = game.instance_id
-        if instance_id not in cleanup_tasks:
-            cleanup_tasks[instance_id] = asyncio.create_task(
-                cleanup_game_after_delay(instance_id, 60)
-            )
-            logger.info(f"Scheduled cleanup for instance {instance_id} in 60 seconds")
+        # The reaper removes it unless someone reconnects in time
+        game.abandoned_at = time.time()
+    reaper.watch(game)  # its idle deadline starts now, as may its abandoned one
 
 
-async def cleanup_game_after_delay(instance_id: str, delay: int) -> None:
-    """Clean up a game instance after a delay if still inactive."""
-    try:
-        await asyncio.sleep(delay)
+def add_instance(game: BaseGame) -> None:
+    """Index a new instance, its players and their websockets, and start watching it for eviction."""
+    registry.add_game(game)
+    reaper.watch(game)
 
-        if instance_id in game_instances:
-            game = game_instances[instance_id]
-            # Double-check all players are still disconnected
-            if all(not p.connected for p in game.players):
-                del game_instances[instance_id]
-                logger.info(f"Cleaned up inactive game instance: {instance_id}")
 
-        if instance_id in cleanup_tasks:
-            del cleanup_tasks[instance_id]
+async def restore_instance(instance_id: str) -> Optional[BaseGame]:
+    """Bring an instance back from its snapshot (e.g. after a restart)."""
+    game = await snapshot_store.load(instance_id, GAME_REGISTRY)
+    if game is None:
+        return None
+
+    # Another rejoin may have restored it while we were reading
+    existing = registry.get_game(instance_id)
+    if existing:
+        game.close()
+        return existing
 
-    except asyncio.CancelledError:
-        logger.info(f"Cleanup cancelled for instance {instance_id}")
-        if instance_id in cleanup_tasks:
-            del cleanup_tasks[instance_id]
+    game.abandoned_at = time.time()  # until the players rejoin
+    add_instance(game)
+    return game
+
+
+async def evict_instance(game: BaseGame, reason: str) -> None:
+    """Remove an instance the reaper gave up on; anyone still connected is told why."""
+    message = "This game was closed due to inactivity."
+    if reason == "memory":
+        message = "This game was closed because the server is busy."
+    await game.broadcast({"type": "game_closed", "reason": reason, "message": message})
+    registry.remove_game(game.instance_id)
+    game.close()
+    await snapshot_store.delete(game.instance_id)
+    logger.info(f"Removed game instance {game.instance_id} ({reason})")
 
 
 if __name__ == "__main__":
     import uvicorn
 
     port = int(os.getenv("PORT", 8500))
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
+    workers = int(os.getenv("WORKERS", 1))
+    if workers > 1:
+        run_cluster("main:app", port, workers)
+    else:
+        uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
@@ -2,36 +2,195 @@
 Curtain Call — Run Persistence (SQLite)
 
 SQLite-backed save/restore so solo runs survive page refreshes.
-Uses Python's built-in sqlite3 module. All DB operations are wrapped
-in asyncio.to_thread() to avoid blocking the event loop.
+Uses Python's built-in sqlite3 module. DB operations run off the event
+loop on dedicated threads:
+- one writer thread (_DbWriter) that owns all writes. Writes requested in
+  the same event-loop tick are handed over as one batch and committed as
+  one transaction, each in its own savepoint so a failure rolls back alone.
+  Write functions therefore never commit themselves.
+- a small pool of reader threads; with WAL they read concurrently with
+  the writer, so loads don't queue behind saves
+
+Each thread opens its own connection (see get_db()).
+
+Saves are write-behind: /save only records the latest state per run_id,
+and a flush SAVE_FLUSH_SECONDS later writes the batch in one transaction.
+Reads consult unflushed saves first, so clients never see older state.
+
+Runs are versioned. /save stores a full state at a new revision; after
+that the client sends /save-patch with ops (games.state_sync format)
+against the revision it knows, and gets 409 if that is stale. Patches
+are appended to run_patches and folded into a full checkpoint every
+CHECKPOINT_EVERY patches; loads replay them on top of the checkpoint.
+
+Meta state (/meta) is served from an in-process LRU cache; every write
+to a user's meta tables invalidates their entry once it has committed
+(write functions register that with _after_commit).
+
+Run states and patches are stored through a small codec (_encode_state /
+_decode_state): a format byte, then zlib-compressed JSON primed with a
+preset dictionary of payload keys and card ids. Rows from before the codec
+are plain JSON text and still load; they are re-encoded on their next save.
+
+A maintenance job (start_maintenance) runs every MAINTENANCE_SECONDS:
+it deletes runs untouched for RUN_RETENTION_DAYS, moves history older than
+HISTORY_ARCHIVE_DAYS into compressed per-user chunks in
+meta_run_history_archive (history reads fall through to it), then runs
+PRAGMA optimize, an incremental vacuum and a WAL checkpoint.
+
+Cluster workers (WORKERS > 1, see games/cluster.py) share the DB file, so
+state kept per process would go stale: with SHARED_DB, saves and patches
+write through (revision checks run inside the write), /meta is not cached,
+and only worker 0 runs maintenance and the startup vacuum.
 
 All data is scoped by username for per-user save progress.
 """
 
 import asyncio
+import copy
+import functools
 import json
+import logging
 import os
+import queue
 import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 
-# Module-level connection
-_conn: sqlite3.Connection | None = None
+from games.state_sync import apply_patch
+
+logger = logging.getLogger(__name__)
 
 DB_DIR = "data"
 DB_PATH = os.path.join(DB_DIR, "curtain-call.db")
+READER_THREADS = int(os.getenv("CURTAIN_CALL_DB_READERS", 4))
+SAVE_FLUSH_SECONDS = float(os.getenv("CURTAIN_CALL_SAVE_FLUSH_SECONDS", 0.5))
+CHECKPOINT_EVERY = 20  # patches per run before they are folded into state_json
+PATCH_OPS = ("add", "remove", "replace")
+META_CACHE_SIZE = int(os.getenv("CURTAIN_CALL_META_CACHE_SIZE", 1024))
+MAINTENANCE_SECONDS = float(os.getenv("CURTAIN_CALL_MAINTENANCE_SECONDS", 3600))
+RUN_RETENTION_DAYS = float(os.getenv("CURTAIN_CALL_RUN_RETENTION_DAYS", 30))
+HISTORY_ARCHIVE_DAYS = float(os.getenv("CURTAIN_CALL_HISTORY_ARCHIVE_DAYS", 180))
+ARCHIVE_BATCH = 1000  # history rows archived per write
+
+# --- Storage codec ---
+
+FORMAT_ZLIB_V1 = 1
+
+# zlib preset dictionary for FORMAT_ZLIB_V1. Never change it: rows written with
+# that format need these exact bytes to decode. Add a new format byte instead.
+_CARD_IDS = (
+    "galvanize bulwark quick-jab lucky-shot block inspire aegis burning-devotion "
+    "cooperative-strike protective-stance protect iron-wall true-strike inspirational-shout "
+    "cleanse aggressive-strike captivating-strike heated-resistance good-fortune "
+    "create-opportunity loaded-insult coup-de-grace pips-cocktail annoying-poke stylish-dance "
+    "hit-where-it-hurts vex best-explanation ultimate-jeer flirtatious-jeer battle-hymn "
+    "shield-bash stand-guard stalwart quick-draw pepper-spray mischief twist-the-knife "
+    "read-the-room catalogue-of-woes unraveling charmed-life lucky-break all-in defiant-roar "
+    "immovable unyielding rousing-recital spiked-barricade sworn-protector dramatic-lighting "
+    "fortress-scene curtain-of-iron war-drums comic-relief plot-twist encore smoke-and-mirrors "
+    "crown-decree crown-rally tome-study tome-insight heirloom-radiance idol-curse heroic-charge "
+    "rallying-banner divine-intervention phalanx-formation commanders-presence sleight-of-hand "
+    "dirty-tricks calculated-gamble double-cross grand-finale stage-whisper standing-ovation "
+    "dramatic-pause shield-slam rallying-cry smoke-bomb trick-shot"
+).split()
+# zlib favours matches near the end, so the payload skeleton goes last
+_STATE_ZDICT = (
+    "".join(f'{{"id": "{card_id}", "instanceId": "' for card_id in _CARD_IDS)
+    + '{"op": "replace", "path": "/runState/currentScene", "value": '
+    '{"op": "add", "path": "/deck/-", "value": {"op": "remove", "path": "/discardPile/'
+    '{"version": 3, "selectedAldricBasic": "galvanize", "selectedPipBasic": "quick-jab", '
+    '"runState": {"currentAct": 1, "currentScene": 0, "phase": "scene-select"}, '
+    '"macguffin": {"currentHP": 0, "maxHP": 0}, "deck": [], "discardPile": [], '
+    '"activeEnchantments": [], "stageProps": [], "gold": 0, "eventHistory": [], '
+    '"nextCombatModifiers": {}, "merchantPurchases": [], "selectedMacGuffin": "treasure-chest", '
+    '"difficulty": 0, "runStats": {"actsCompleted": 0, "bossesDefeated": [], '
+    '"maxOvationReached": 0, "maxEnemyDebuffTypes": 0, "flawlessBoss": false, "finalGold": 0, '
+    '"result": "defeat", "macguffinId": "treasure-chest", "difficulty": 0, '
+    '"aldricBasic": "galvanize", "pipBasic": "quick-jab"}}'
+).encode()
+
+
+def _encode_state(value) -> bytes:
+    """Run state (or patch ops) -> stored bytes."""
+    compressor = zlib.compressobj(6, zdict=_STATE_ZDICT)
+    data = compressor.compress(json.dumps(value).encode()) + compressor.flush()
+    return bytes([FORMAT_ZLIB_V1]) + data
+
+
+def _decode_state(stored: str | bytes):
+    """Stored column value -> run state (or patch ops). Plain JSON text is the legacy format."""
+    if isinstance(stored, str):
+        return json.loads(stored)
+    if stored[0] == FORMAT_ZLIB_V1:
+        return json.loads(zlib.decompressobj(zdict=_STATE_ZDICT).decompress(stored[1:]))
+    raise ValueError(f"Unknown run state format {stored[0]}")
+
+
+# One connection per thread, opened lazily by get_db()
+_local = threading.local()
+_connections: list[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+
+_writer: "_DbWriter | None" = None
+_readers: ThreadPoolExecutor | None = None
+
+
+@dataclass
+class _PendingSave:
+    """Unflushed writes for one run: a full state, or patches on top of the stored one."""
+    username: str
+    base_revision: int  # revision of `state`, or of the stored run the patches apply to
+    state: dict | None = None
+    patches: list[list[dict]] = field(default_factory=list)
+    head: dict | None = None  # state with the patches applied, to check the next one against (not stored)
+
+    @property
+    def revision(self) -> int:
+        return self.base_revision + len(self.patches)
+
+
+# Write-behind saves, by run_id. Insertion order = save order.
+_pending_saves: dict[str, _PendingSave] = {}
+_flushing_saves: dict[str, _PendingSave] = {}  # batch currently being written
+_flush_handle: asyncio.TimerHandle | None = None
+_flush_task: asyncio.Future | None = None
+_maintenance_handle: asyncio.TimerHandle | None = None
+_maintenance_task: asyncio.Future | None = None
+
+# Per-user meta state, least recently used first. Used from reader and writer threads.
+_meta_cache: OrderedDict[str, dict] = OrderedDict()
+_meta_version = 0  # bumped by every invalidation, so a read that raced one isn't cached
+_meta_lock = threading.Lock()
+_known_profiles: set[str] = set()  # users whose meta_profile row is known to exist
+_meta_cache_limit = META_CACHE_SIZE  # 0 with SHARED_DB
+
+# Index of this process when it is a cluster worker, else None (see the module docstring).
+# Set by init_db(), not at import: spawned workers import this module (via main.py)
+# before games.cluster has put PARLOR_WORKER_INDEX in their environment.
+WORKER_INDEX: str | None = None
+SHARED_DB = False
 
 
 def init_db():
-    """Create data dir, open connection with WAL mode, create tables."""
-    global _conn
+    """Create data dir and tables (WAL mode), then start the writer and reader threads."""
+    global _writer, _readers, WORKER_INDEX, SHARED_DB, _meta_cache_limit
+    WORKER_INDEX = os.getenv("PARLOR_WORKER_INDEX")
+    SHARED_DB = WORKER_INDEX is not None
+    _meta_cache_limit = 0 if SHARED_DB else META_CACHE_SIZE
     os.makedirs(DB_DIR, exist_ok=True)
-    _conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    _conn.execute("PRAGMA journal_mode=WAL")
+    conn = get_db()
+    if WORKER_INDEX in (None, "0"):
+        _migrate_auto_vacuum()
 
     # Run saves — add username column if missing (migration from pre-user schema)
-    _conn.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS runs (
             run_id      TEXT PRIMARY KEY,
             created_at  TEXT NOT NULL DEFAULT (datetime('now')),
@@ -39,23 +198,35 @@ def init_db():
             status      TEXT NOT NULL DEFAULT 'active',
             current_act INTEGER NOT NULL DEFAULT 1,
             current_scene TEXT NOT NULL DEFAULT '0',
-            state_json  TEXT NOT NULL,
-            username    TEXT NOT NULL DEFAULT ''
+            state_json  BLOB NOT NULL,  -- _encode_state(); JSON text in older rows
+            username    TEXT NOT NULL DEFAULT '',
+            revision    INTEGER NOT NULL DEFAULT 0
         )
     """)
     _migrate_add_username_to_runs()
+    _migrate_add_revision_to_runs()
+
+    # Delta saves on top of runs.state_json, folded in every CHECKPOINT_EVERY patches
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS run_patches (
+            run_id      TEXT NOT NULL,
+            revision    INTEGER NOT NULL,
+            ops_json    BLOB NOT NULL,  -- _encode_state(ops)
+            PRIMARY KEY (run_id, revision)
+        )
+    """)
 
     # Drop old single-user meta tables if they exist (pre-user schema)
     _migrate_meta_tables()
 
     # Meta-Progression tables (per-user)
-    _conn.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS meta_profile (
             username    TEXT PRIMARY KEY,
             tickets     INTEGER NOT NULL DEFAULT 0
         )
     """)
-    _conn.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS meta_unlocks (
             username    TEXT NOT NULL,
             track_id    TEXT NOT NULL,
@@ -63,14 +234,14 @@ def init_db():
             PRIMARY KEY (username, track_id, tier)
         )
     """)
-    _conn.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS meta_achievements (
             username        TEXT NOT NULL,
             achievement_id  TEXT NOT NULL,
             PRIMARY KEY (username, achievement_id)
         )
     """)
-    _conn.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS meta_run_history (
             id              INTEGER PRIMARY KEY AUTOINCREMENT,
             username        TEXT NOT NULL DEFAULT '',
@@ -86,7 +257,35 @@ def init_db():
             pip_basic       TEXT
         )
     """)
-    _conn.commit()
+    # Old history, moved out by maintenance: _encode_state(entries, newest first)
+    # for ids first_id..last_id of one user
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS meta_run_history_archive (
+            username    TEXT NOT NULL,
+            first_id    INTEGER NOT NULL,
+            last_id     INTEGER NOT NULL,
+            data        BLOB NOT NULL,
+            PRIMARY KEY (username, last_id)
+        )
+    """)
+    conn.commit()
+    _migrate_run_stats()
+    _migrate_add_indexes()
+    for problem in check_query_plans():
+        logger.warning(f"Curtain Call query plan: {problem}")
+    _release_thread_db()
+
+    _writer = _DbWriter()
+    _readers = ThreadPoolExecutor(max_workers=READER_THREADS, thread_name_prefix="curtain-call-db-reader",
+                                  initializer=_init_reader)
+
+
+def _migrate_auto_vacuum():
+    """Use incremental auto-vacuum, so maintenance can give free pages back to the OS."""
+    conn = get_db()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")  # an existing database only switches over on a vacuum
 
 
 def _migrate_add_username_to_runs():
@@ -98,6 +297,15 @@ def _migrate_add_username_to_runs():
         conn.commit()
 
 
+def _migrate_add_revision_to_runs():
+    """Add revision column to runs table if it doesn't exist."""
+    conn = get_db()
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(runs)").fetchall()]
+    if "revision" not in cols:
+        conn.execute("ALTER TABLE runs ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        conn.commit()
+
+
 def _migrate_meta_tables():
     """Drop old single-user meta tables (id=1 schema) so they get recreated with username."""
     conn = get_db()
@@ -111,204 +319,781 @@ def _migrate_meta_tables():
         conn.commit()
 
 
+# Rollup dimensions: name -> meta_run_history column (and history entry key)
+_STAT_DIMENSIONS = {
+    "macguffin": ("macguffin_id", "macguffinId"),
+    "difficulty": ("difficulty", "difficulty"),
+    "aldric_basic": ("aldric_basic", "aldricBasic"),
+    "pip_basic": ("pip_basic", "pipBasic"),
+}
+GLOBAL_STATS = "*"  # meta_run_stats scope of the all-players rollup
+
+
+def _migrate_run_stats():
+    """Create the meta_run_stats rollup, backfilling it from history the first time."""
+    conn = get_db()
+    conn.execute("BEGIN IMMEDIATE")  # cluster workers start together; one creates it
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'meta_run_stats'"
+    ).fetchone()
+    if exists:
+        conn.rollback()
+        return
+
+    # Per (scope, dimension, value): scope is a username or GLOBAL_STATS,
+    # dimension "all" (value '') is the overall total. Kept by _record_stats.
+    conn.execute("""
+        CREATE TABLE meta_run_stats (
+            scope           TEXT NOT NULL,
+            dimension       TEXT NOT NULL,
+            value           TEXT NOT NULL,
+            runs            INTEGER NOT NULL DEFAULT 0,
+            wins            INTEGER NOT NULL DEFAULT 0,
+            acts_completed  INTEGER NOT NULL DEFAULT 0,
+            bosses_defeated INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, dimension, value)
+        )
+    """)
+    dimensions = {"all": "''", **{name: f"COALESCE({column}, '')" for name, (column, _) in _STAT_DIMENSIONS.items()}}
+    for name, value in dimensions.items():
+        for scope, where in ((f"'{GLOBAL_STATS}'", ""), ("username", f"WHERE username NOT IN ('', '{GLOBAL_STATS}')")):
+            conn.execute(
+                "INSERT INTO meta_run_stats "
+                f"SELECT {scope}, '{name}', CAST({value} AS TEXT), COUNT(*), SUM(result = 'victory'), "
+                f"SUM(acts_completed), SUM(bosses_defeated) FROM meta_run_history {where} GROUP BY 1, 3"
+            )
+    conn.commit()
+
+
+# Indexes for the per-page-load lookups (see _QUERY_PLAN_CHECKS)
+_INDEXES = {
+    # _get_active_run_for_user: equality on username/status, newest first; covers run_id
+    "idx_runs_user_status_updated": "runs (username, status, updated_at, run_id)",
+    # _get_recent_user: newest run with a username, read from the index alone
+    "idx_runs_updated": "runs (updated_at, username)",
+    # _get_meta_state history: one user's rows, newest first
+    "idx_history_user_id": "meta_run_history (username, id)",
+    # _archive_history: oldest rows first
+    "idx_history_completed": "meta_run_history (completed_at)",
+    # _get_recent_user fallback: newest history row with a username, read from the index alone
+    "idx_history_named": "meta_run_history (id, username) WHERE username != ''",
+}
+
+
+def _migrate_add_indexes():
+    """Create any missing indexes from _INDEXES."""
+    conn = get_db()
+    for name, columns in _INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+    conn.commit()
+
+
 def close_db():
-    """Close the database connection."""
-    global _conn
-    if _conn:
-        _conn.close()
-        _conn = None
+    """Flush pending saves, let queued operations finish, then close every thread's connection."""
+    global _writer, _readers, _flush_handle, _maintenance_handle
+    if _flush_handle:
+        _flush_handle.cancel()
+        _flush_handle = None
+    if _maintenance_handle:
+        _maintenance_handle.cancel()
+        _maintenance_handle = None
+    if _maintenance_task:
+        _maintenance_task.cancel()
+    if _pending_saves and _writer:
+        batch = dict(_pending_saves)
+        _pending_saves.clear()
+        _writer.call(_save_runs, batch)
+
+    if _writer:
+        _writer.stop()
+    if _readers:
+        _readers.shutdown(wait=True)
+    _writer = _readers = None
+
+    _release_thread_db()  # so a later init_db on this thread opens a fresh one
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+    with _meta_lock:
+        _meta_cache.clear()
+    _known_profiles.clear()
 
 
 def get_db() -> sqlite3.Connection:
-    """Return the module-level connection."""
-    if _conn is None:
+    """Return this thread's connection, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        # check_same_thread=False only so close_db() can close it from the main thread
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        _local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+
+def _init_reader():
+    """Reader threads can't write, even by mistake."""
+    get_db().execute("PRAGMA query_only=ON")
+
+
+def _release_thread_db():
+    """Close this thread's connection (used by init_db, which runs on the event loop thread)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        with _connections_lock:
+            _connections.remove(conn)
+        conn.close()
+
+
+async def _read(fn, *args):
+    """Run a read-only DB function on the reader pool."""
+    if _readers is None:
         raise RuntimeError("Database not initialized. Call init_db() first.")
-    return _conn
+    return await asyncio.get_running_loop().run_in_executor(_readers, functools.partial(fn, *args))
 
 
-# --- CRUD functions (synchronous, called via to_thread) ---
-
-def _save_run(run_id: str, state: dict, username: str = ""):
+async def _write(fn, *args):
+    """Run a DB function that writes on the writer thread, in this tick's transaction."""
+    if _writer is None:
+        raise RuntimeError("Database not initialized. Call init_db() first.")
+    return await _writer.submit(fn, *args)
+
+
+def _after_commit(callback, *args):
+    """From a write function: run callback(*args) once its changes are committed; dropped on rollback."""
+    _local.on_commit.append((callback, args))
+
+
+class _Rollback(Exception):
+    """Raised by a write function to undo its changes; the caller gets `result`."""
+
+    def __init__(self, result=None):
+        super().__init__()
+        self.result = result
+
+
+class _DbWriter:
+    """The writer thread: runs batches of write functions, one transaction per batch."""
+
+    def __init__(self):
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._batch: list[tuple] = []  # (fn, args, future) submitted this tick
+        self._thread = threading.Thread(target=self._run, name="curtain-call-db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args) -> asyncio.Future:
+        """Queue a write; everything submitted before the loop's next tick goes in one batch."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._batch:
+            loop.call_soon(self._send)
+        self._batch.append((fn, args, future))
+        return future
+
+    def call(self, fn, *args):
+        """Run a write and wait for it, from outside the event loop (shutdown)."""
+        future = Future()
+        self._queue.put([(fn, args, future)])
+        return future.result()
+
+    async def run_alone(self, fn, *args):
+        """Run a function outside any transaction, after the writes queued so far (e.g. VACUUM)."""
+        if self._batch:
+            self._send()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put((fn, args, future))
+        return await future
+
+    def stop(self):
+        """Finish queued batches, then end the thread."""
+        if self._batch:
+            self._send()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _send(self):
+        batch, self._batch = self._batch, []
+        self._queue.put(batch)
+
+    def _run(self):
+        conn = get_db()
+        conn.isolation_level = None  # transactions are managed explicitly below
+        while (item := self._queue.get()) is not None:
+            if isinstance(item, tuple):
+                self._run_alone(item)
+            else:
+                self._run_batch(conn, item)
+
+    def _run_alone(self, item: tuple):
+        fn, args, future = item
+        _local.on_commit = []
+        try:
+            outcome = (future, fn(*args), None)
+        except Exception as e:
+            outcome = (future, None, e)
+        else:
+            self._run_callbacks(_local.on_commit)
+        self._settle_all([outcome])
+
+    def _run_batch(self, conn: sqlite3.Connection, batch: list[tuple]):
+        outcomes = []  # (future, result, exception)
+        callbacks = []  # _after_commit callbacks of the writes that weren't rolled back
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, future in batch:
+                conn.execute("SAVEPOINT write")
+                _local.on_commit = []
+                try:
+                    outcomes.append((future, fn(*args), None))
+                    callbacks += _local.on_commit
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    if isinstance(e, _Rollback):
+                        outcomes.append((future, e.result, None))
+                    else:
+                        outcomes.append((future, None, e))
+                conn.execute("RELEASE write")
+            conn.execute("COMMIT")
+        except Exception as e:
+            logger.exception(f"Curtain Call write batch of {len(batch)} failed")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            outcomes = [(future, None, e) for _, _, future in batch]
+        else:
+            self._run_callbacks(callbacks)
+        self._settle_all(outcomes)
+
+    @staticmethod
+    def _run_callbacks(callbacks: list[tuple]):
+        for callback, args in callbacks:
+            try:
+                callback(*args)
+            except Exception:
+                logger.exception("Curtain Call after-commit callback failed")
+
+    @staticmethod
+    def _settle_all(outcomes: list[tuple]):
+        for future, result, exception in outcomes:
+            if isinstance(future, asyncio.Future):
+                future.get_loop().call_soon_threadsafe(_settle, future, result, exception)
+            elif exception:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+
+def _settle(future: asyncio.Future, result, exception: Exception | None):
+    if future.cancelled():
+        return
+    if exception:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+# --- CRUD functions (synchronous, called via _read / _write) ---
+
+def _valid_state(state) -> bool:
+    """Whether a run state (from /save, or after a patch) has the shape _write_checkpoint needs."""
+    return isinstance(state, dict) and isinstance(state.get("runState", {}), dict)
+
+
+def _patched(state: dict, ops: list[dict]) -> dict:
+    """A copy of `state` with a patch applied. Raises if it doesn't apply or leaves no valid state."""
+    state = apply_patch(copy.deepcopy(state), ops)
+    if not _valid_state(state):
+        raise ValueError("patch leaves an invalid run state")
+    return state
+
+def _save_runs(batch: dict[str, _PendingSave]):
+    """Write a batch of saves. A run that fails to write is logged and dropped, not retried."""
     conn = get_db()
+    for run_id, save in batch.items():
+        conn.execute("SAVEPOINT run")
+        try:
+            _write_run(conn, run_id, save)
+        except Exception:
+            logger.exception(f"Failed to write run {run_id}, dropping the save")
+            conn.execute("ROLLBACK TO run")
+        conn.execute("RELEASE run")
+
+
+_PATCH_COUNT_SQL = "SELECT COUNT(*) FROM run_patches WHERE run_id = ?"
+
+
+def _write_run(conn: sqlite3.Connection, run_id: str, save: _PendingSave):
+    if save.state is not None:
+        _write_checkpoint(conn, run_id, save.state, save.revision, save.username)
+        return
+
+    conn.executemany(
+        "INSERT OR REPLACE INTO run_patches (run_id, revision, ops_json) VALUES (?, ?, ?)",
+        [(run_id, save.base_revision + 1 + i, _encode_state(ops)) for i, ops in enumerate(save.patches)],
+    )
+    # Patches past a log that stopped applying were never part of the run
+    conn.execute("DELETE FROM run_patches WHERE run_id = ? AND revision > ?", (run_id, save.revision))
+    conn.execute(
+        "UPDATE runs SET revision = ?, updated_at = datetime('now'), "
+        "username = COALESCE(NULLIF(?, ''), username) WHERE run_id = ?",
+        (save.revision, save.username, run_id),
+    )
+    count = conn.execute(_PATCH_COUNT_SQL, (run_id,)).fetchone()[0]
+    if count >= CHECKPOINT_EVERY:
+        assembled = _assemble_run(conn, run_id)
+        if assembled:
+            _write_checkpoint(conn, run_id, *assembled, save.username)
+
+
+def _write_checkpoint(conn: sqlite3.Connection, run_id: str, state: dict, revision: int, username: str):
+    """Store a full state (replacing any patches) as the run's checkpoint. An empty username keeps the stored one."""
     run_state = state.get("runState", {})
     current_act = run_state.get("currentAct", 1)
     current_scene = str(run_state.get("currentScene", "0"))
-    state_json = json.dumps(state)
     conn.execute(
-        """INSERT OR REPLACE INTO runs (run_id, updated_at, status, current_act, current_scene, state_json, username)
-           VALUES (?, datetime('now'), 'active', ?, ?, ?, ?)""",
-        (run_id, current_act, current_scene, state_json, username),
+        """INSERT OR REPLACE INTO runs
+               (run_id, updated_at, status, current_act, current_scene, state_json, username, revision)
+           VALUES (?, datetime('now'), 'active', ?, ?, ?,
+                   COALESCE(NULLIF(?, ''), (SELECT username FROM runs WHERE run_id = ?), ''), ?)""",
+        (run_id, current_act, current_scene, _encode_state(state), username, run_id, revision),
     )
-    conn.commit()
+    conn.execute("DELETE FROM run_patches WHERE run_id = ?", (run_id,))
 
 
-def _load_run(run_id: str) -> dict | None:
-    conn = get_db()
-    row = conn.execute(
-        "SELECT state_json FROM runs WHERE run_id = ? AND status = 'active'",
-        (run_id,),
-    ).fetchone()
+def _save_run_now(run_id: str, state: dict, username: str) -> int:
+    """Store a full state at the run's next revision (SHARED_DB write-through)."""
+    revision = (_get_run_revision(run_id) or 0) + 1
+    _write_checkpoint(get_db(), run_id, state, revision, username)
+    return revision
+
+
+def _save_patch_now(run_id: str, base_revision: int, ops: list[dict], username: str) -> int | None:
+    """Store a patch if `base_revision` is the run's latest and it applies (SHARED_DB write-through)."""
+    current = _assemble_run(get_db(), run_id)
+    if current is None or current[1] != base_revision:
+        return None
+    _patched(current[0], ops)  # raises if it doesn't apply
+    _write_run(get_db(), run_id, _PendingSave(username, base_revision, patches=[ops]))
+    return base_revision + 1
+
+
+_LOAD_RUN_SQL = "SELECT state_json, revision FROM runs WHERE run_id = ? AND status = 'active'"
+_RUN_PATCHES_SQL = "SELECT revision, ops_json FROM run_patches WHERE run_id = ? ORDER BY revision"
+
+
+def _assemble_run(conn: sqlite3.Connection, run_id: str) -> tuple[dict, int] | None:
+    """Checkpoint plus patch log -> (state, revision) of an active run.
+
+    The revision is the one the state actually reached: if a patch doesn't
+    apply, that's the revision before it, and the rest of the log is ignored.
+    """
+    row = conn.execute(_LOAD_RUN_SQL, (run_id,)).fetchone()
     if row is None:
         return None
-    return json.loads(row[0])
+    state = _decode_state(row[0])
+    patches = conn.execute(_RUN_PATCHES_SQL, (run_id,)).fetchall()
+    reached = row[1] - len(patches)  # the checkpoint's revision
+    for revision, ops_json in patches:
+        try:
+            state = apply_patch(state, _decode_state(ops_json))
+        except (KeyError, IndexError, ValueError, TypeError):
+            logger.warning(f"Run {run_id}: patch {revision} does not apply, ignoring the rest")
+            break
+        reached = revision
+    return state, reached
+
+
+def _load_run(run_id: str) -> tuple[dict, int] | None:
+    return _assemble_run(get_db(), run_id)
+
+
+_RUN_REVISION_SQL = "SELECT revision FROM runs WHERE run_id = ? AND status = 'active'"
+
+
+def _get_run_revision(run_id: str) -> int | None:
+    row = get_db().execute(_RUN_REVISION_SQL, (run_id,)).fetchone()
+    return row[0] if row else None
 
 
 def _delete_run(run_id: str) -> bool:
     conn = get_db()
     cursor = conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
-    conn.commit()
+    conn.execute("DELETE FROM run_patches WHERE run_id = ?", (run_id,))
     return cursor.rowcount > 0
 
 
+_RECENT_RUN_USER_SQL = "SELECT username FROM runs WHERE username != '' ORDER BY updated_at DESC LIMIT 1"
+_RECENT_HISTORY_USER_SQL = "SELECT username FROM meta_run_history WHERE username != '' ORDER BY id DESC LIMIT 1"
+
+
 def _get_recent_user() -> str | None:
     """Get the username with the most recently updated run or meta activity."""
     conn = get_db()
     # Check runs table first (most likely to have recent activity)
-    row = conn.execute(
-        "SELECT username FROM runs WHERE username != '' ORDER BY updated_at DESC LIMIT 1"
-    ).fetchone()
+    row = conn.execute(_RECENT_RUN_USER_SQL).fetchone()
     if row:
         return row[0]
     # Fall back to meta_run_history
-    row = conn.execute(
-        "SELECT username FROM meta_run_history WHERE username != '' ORDER BY id DESC LIMIT 1"
-    ).fetchone()
+    row = conn.execute(_RECENT_HISTORY_USER_SQL).fetchone()
     if row:
         return row[0]
     return None
 
 
+_ACTIVE_RUN_SQL = ("SELECT run_id FROM runs WHERE username = ? AND status = 'active' "
+                   "ORDER BY updated_at DESC LIMIT 1")
+
+
 def _get_active_run_for_user(username: str) -> dict | None:
     """Get the active run for a specific user."""
     conn = get_db()
-    row = conn.execute(
-        "SELECT run_id, state_json FROM runs WHERE username = ? AND status = 'active' "
-        "ORDER BY updated_at DESC LIMIT 1",
-        (username,),
-    ).fetchone()
+    row = conn.execute(_ACTIVE_RUN_SQL, (username,)).fetchone()
     if row is None:
         return None
-    return {"runId": row[0], "state": json.loads(row[1])}
+    assembled = _assemble_run(conn, row[0])
+    if assembled is None:
+        return None
+    return {"runId": row[0], "state": assembled[0]}
+
+
+# --- Write-behind saves (event loop side) ---
+
+async def _current_revision(run_id: str) -> int | None:
+    """Latest revision of a run, counting unflushed saves. None if there is no such run."""
+    save = _pending_saves.get(run_id) or _flushing_saves.get(run_id)
+    if save:
+        return save.revision
+    revision = await _read(_get_run_revision, run_id)
+    save = _pending_saves.get(run_id) or _flushing_saves.get(run_id)  # saved while we read
+    return save.revision if save else revision
+
+
+async def _queue_save(run_id: str, state: dict, username: str) -> int:
+    """Record a full state for a run at a new revision and make sure a flush is coming."""
+    if SHARED_DB:
+        return await _write(_save_run_now, run_id, state, username)
+    revision = (await _current_revision(run_id) or 0) + 1
+    _pending_saves.pop(run_id, None)  # re-insert so order stays most-recent-last
+    _pending_saves[run_id] = _PendingSave(username, revision, state=state)
+    _schedule_flush()
+    return revision
+
+
+async def _queue_patch(run_id: str, base_revision: int, ops: list[dict], username: str) -> int | None:
+    """Record a patch against `base_revision`. None if that isn't the run's latest revision.
+
+    The patch is applied to the run's current state first, so one that doesn't
+    apply raises here and is never stored.
+    """
+    if SHARED_DB:
+        return await _write(_save_patch_now, run_id, base_revision, ops, username)
+    save = _pending_saves.get(run_id)
+    if save is None:
+        current = await _current_run(run_id)
+        save = _pending_saves.get(run_id)  # patched or saved while we read
+        if save is None:
+            if current is None:
+                return None
+            save = _PendingSave(username, current[1], head=current[0])
+    if save.revision != base_revision:
+        return None
 
+    # Apply to a copy, so a bad patch changes nothing
+    if save.state is not None:
+        # Unflushed full state: fold the patch in
+        save.state = _patched(save.state, ops)
+        save.base_revision += 1
+    else:
+        save.head = _patched(save.head, ops)
+        save.patches.append(ops)
+    save.username = username or save.username
+    _pending_saves.pop(run_id, None)  # re-insert so order stays most-recent-last
+    _pending_saves[run_id] = save
+    _schedule_flush()
+    return save.revision
+
+
+def _merge_saves(older: _PendingSave, newer: _PendingSave) -> _PendingSave:
+    """Combine two unflushed saves of one run into one."""
+    if newer.state is not None:
+        return newer
+    if older.state is not None:
+        for ops in newer.patches:
+            try:
+                older.state = apply_patch(older.state, ops)
+            except (KeyError, IndexError, ValueError, TypeError):
+                logger.warning("Dropping a save patch that does not apply")
+                break
+        older.base_revision = newer.revision
+    else:
+        older.patches.extend(newer.patches)
+        older.head = newer.head
+    older.username = newer.username
+    return older
+
+
+def _schedule_flush():
+    global _flush_handle
+    if _flush_handle is None:
+        _flush_handle = asyncio.get_running_loop().call_later(SAVE_FLUSH_SECONDS, _start_flush)
+
+
+def _start_flush():
+    global _flush_handle, _flush_task
+    _flush_handle = None
+    _flush_task = asyncio.ensure_future(_flush_saves())
+
+
+async def _flush_saves():
+    """Write all pending saves in one transaction."""
+    if _flushing_saves:
+        _schedule_flush()  # previous batch is still being written
+        return
+    if not _pending_saves:
+        return
+
+    _flushing_saves.update(_pending_saves)
+    _pending_saves.clear()
+    try:
+        await _write(_save_runs, dict(_flushing_saves))
+    except Exception:
+        logger.exception("Failed to flush run saves, will retry")
+        # Put the batch back in front of anything saved since
+        for run_id, save in _flushing_saves.items():
+            newer = _pending_saves.pop(run_id, None)
+            _pending_saves[run_id] = _merge_saves(save, newer) if newer else save
+        _schedule_flush()
+    finally:
+        _flushing_saves.clear()
+
+
+def _unflushed_chain(run_id: str) -> list[_PendingSave]:
+    """Unflushed saves of a run, oldest first."""
+    return [save for save in (_flushing_saves.get(run_id), _pending_saves.get(run_id)) if save]
+
+
+def _replay(state: dict | None, revision: int, chain: list[_PendingSave]) -> tuple[dict, int] | None:
+    """Apply unflushed saves on top of a stored (state, revision), skipping revisions it already has."""
+    for save in chain:
+        if save.state is not None:
+            state, revision = copy.deepcopy(save.state), save.base_revision
+        for i, ops in enumerate(save.patches):
+            if save.base_revision + 1 + i <= revision or state is None:
+                continue
+            if save.base_revision + 1 + i > revision + 1:
+                logger.warning("Unflushed save patch is past the stored revision, ignoring the rest")
+                return state, revision
+            try:
+                state = apply_patch(state, ops)
+            except (KeyError, IndexError, ValueError, TypeError):
+                logger.warning("Unflushed save patch does not apply, ignoring the rest")
+                return state, revision
+            revision += 1
+    return (state, revision) if state is not None else None
+
+
+async def _current_run(run_id: str) -> tuple[dict, int] | None:
+    """Latest (state, revision) of a run, including unflushed saves."""
+    while True:
+        chain = _unflushed_chain(run_id)
+        if any(save.state is not None for save in chain):
+            return _replay(None, 0, chain)
+        loaded = await _read(_load_run, run_id)
+        chain = _unflushed_chain(run_id)
+        if any(save.state is not None for save in chain):
+            continue  # a full save arrived while we read
+        if loaded is None:
+            return None
+        return _replay(*loaded, chain)
+
+
+def _latest_unflushed_run_for_user(username: str) -> str | None:
+    """run_id of the most recent not-yet-written save by a user."""
+    for saves in (_pending_saves, _flushing_saves):
+        for run_id, save in reversed(saves.items()):
+            if save.username == username:
+                return run_id
+    return None
 
-# --- Meta-Progression CRUD (synchronous, called via to_thread) ---
 
-def _ensure_profile(username: str):
-    conn = get_db()
+# --- Meta state cache ---
+
+def _cached_meta(username: str) -> dict | None:
+    with _meta_lock:
+        state = _meta_cache.get(username)
+        if state is not None:
+            _meta_cache.move_to_end(username)
+        return state
+
+
+def _invalidate_meta(username: str, state: dict | None = None):
+    """Drop (or replace with `state`) a user's cached meta state. Call after committing a change."""
+    global _meta_version
+    with _meta_lock:
+        _meta_version += 1
+        _meta_cache.pop(username, None)
+        if state is not None:
+            _meta_cache[username] = state
+            if len(_meta_cache) > _meta_cache_limit:
+                _meta_cache.popitem(last=False)
+
+
+# --- Meta-Progression CRUD (synchronous, called via _read / _write) ---
+
+HISTORY_LIMIT = 50  # runs of history in the meta state, and default /history page size
+HISTORY_PAGE_MAX = 200
+HISTORY_COLUMNS = ("id, completed_at, result, acts_completed, bosses_defeated, "
+                   "macguffin_id, difficulty, tickets_earned, final_gold, aldric_basic, pip_basic")
+
+
+def _history_entry(r: tuple) -> dict:
+    """meta_run_history row (HISTORY_COLUMNS) -> API shape."""
+    return {
+        "id": r[0], "completedAt": r[1], "result": r[2],
+        "actsCompleted": r[3], "bossesDefeated": r[4],
+        "macguffinId": r[5], "difficulty": r[6],
+        "ticketsEarned": r[7], "finalGold": r[8],
+        "aldricBasic": r[9], "pipBasic": r[10]
+    }
+
+
+def _insert_profile(conn: sqlite3.Connection, username: str):
     conn.execute(
         "INSERT OR IGNORE INTO meta_profile (username, tickets) VALUES (?, 0)",
         (username,),
     )
-    conn.commit()
 
 
-def _get_meta_state(username: str) -> dict:
-    conn = get_db()
-    _ensure_profile(username)
+def _ensure_profile(username: str):
+    if username in _known_profiles:
+        return
+    _insert_profile(get_db(), username)
+    _after_commit(_remember_profile, username)
+
+
+def _remember_profile(username: str):
+    """After commit: the user's meta_profile row exists. Not tracked with SHARED_DB."""
+    if not SHARED_DB:
+        _known_profiles.add(username)
 
-    row = conn.execute(
-        "SELECT tickets FROM meta_profile WHERE username = ?", (username,)
-    ).fetchone()
-    tickets = row[0] if row else 0
 
+_TICKETS_SQL = "SELECT tickets FROM meta_profile WHERE username = ?"
+_UNLOCKS_SQL = "SELECT track_id, tier FROM meta_unlocks WHERE username = ?"
+_ACHIEVEMENTS_SQL = "SELECT achievement_id FROM meta_achievements WHERE username = ?"
+_HISTORY_SQL = f"SELECT {HISTORY_COLUMNS} FROM meta_run_history WHERE username = ? ORDER BY id DESC LIMIT ?"
+_HISTORY_PAGE_SQL = (f"SELECT {HISTORY_COLUMNS} FROM meta_run_history "
+                     "WHERE username = ? AND id < ? ORDER BY id DESC LIMIT ?")
+_ARCHIVED_HISTORY_SQL = ("SELECT data FROM meta_run_history_archive WHERE username = ? AND first_id < ? "
+                         "ORDER BY last_id DESC")
+
+
+def _read_tickets(conn: sqlite3.Connection, username: str) -> int:
+    row = conn.execute(_TICKETS_SQL, (username,)).fetchone()
+    return row[0] if row else 0
+
+
+def _read_unlocks(conn: sqlite3.Connection, username: str) -> dict[str, list[int]]:
     unlocks = {}
-    for r in conn.execute(
-        "SELECT track_id, tier FROM meta_unlocks WHERE username = ?", (username,)
-    ).fetchall():
+    for r in conn.execute(_UNLOCKS_SQL, (username,)).fetchall():
         track_id, tier = r
         if track_id not in unlocks:
             unlocks[track_id] = []
         unlocks[track_id].append(tier)
+    return unlocks
+
+
+def _read_achievements(conn: sqlite3.Connection, username: str) -> list[str]:
+    return [r[0] for r in conn.execute(_ACHIEVEMENTS_SQL, (username,)).fetchall()]
+
+
+def _read_history(conn: sqlite3.Connection, username: str, before: int | None = None,
+                  limit: int = HISTORY_LIMIT) -> list[dict]:
+    """History entries newest first; `before` is a keyset cursor (only ids below it)."""
+    if before is None:
+        rows = conn.execute(_HISTORY_SQL, (username, limit))
+    else:
+        rows = conn.execute(_HISTORY_PAGE_SQL, (username, before, limit))
+    entries = [_history_entry(r) for r in rows.fetchall()]
+    if len(entries) < limit:
+        # Older runs may have been archived by maintenance
+        cursor = entries[-1]["id"] if entries else before
+        entries += _read_archived_history(conn, username, cursor, limit - len(entries))
+    return entries
+
+
+def _read_archived_history(conn: sqlite3.Connection, username: str, before: int | None,
+                           limit: int) -> list[dict]:
+    entries = []
+    for (data,) in conn.execute(_ARCHIVED_HISTORY_SQL, (username, before if before is not None else 2 ** 63 - 1)):
+        for entry in _decode_state(data):
+            if before is None or entry["id"] < before:
+                entries.append(entry)
+                if len(entries) == limit:
+                    return entries
+    return entries
+
+
+# Parts of the meta state, as selected by /meta?fields=
+_META_FIELDS = {
+    "tickets": _read_tickets,
+    "unlocks": _read_unlocks,
+    "achievements": _read_achievements,
+    "history": _read_history,
+}
+
+
+def _get_meta_fields(username: str, fields: tuple[str, ...]) -> dict:
+    """Just some parts of a user's meta state (not cached)."""
+    conn = get_db()
+    return {name: _META_FIELDS[name](conn, username) for name in fields}
 
-    achievements = [
-        r[0] for r in conn.execute(
-            "SELECT achievement_id FROM meta_achievements WHERE username = ?", (username,)
-        ).fetchall()
-    ]
-
-    history = []
-    for r in conn.execute(
-        "SELECT id, completed_at, result, acts_completed, bosses_defeated, "
-        "macguffin_id, difficulty, tickets_earned, final_gold, aldric_basic, pip_basic "
-        "FROM meta_run_history WHERE username = ? ORDER BY id DESC LIMIT 50",
-        (username,),
-    ).fetchall():
-        history.append({
-            "id": r[0], "completedAt": r[1], "result": r[2],
-            "actsCompleted": r[3], "bossesDefeated": r[4],
-            "macguffinId": r[5], "difficulty": r[6],
-            "ticketsEarned": r[7], "finalGold": r[8],
-            "aldricBasic": r[9], "pipBasic": r[10]
-        })
 
-    return {
-        "tickets": tickets,
-        "unlocks": unlocks,
-        "achievements": achievements,
-        "history": history
-    }
+def _get_history_page(username: str, before: int | None, limit: int) -> list[dict]:
+    return _read_history(get_db(), username, before, limit)
 
 
-def _add_tickets(username: str, amount: int) -> int:
-    conn = get_db()
-    _ensure_profile(username)
-    conn.execute(
-        "UPDATE meta_profile SET tickets = tickets + ? WHERE username = ?",
-        (amount, username),
-    )
-    conn.commit()
+def _get_meta_state(username: str) -> dict:
+    """Read a user's meta state from the DB and cache it."""
+    with _meta_lock:
+        version = _meta_version
+    state = _get_meta_fields(username, tuple(_META_FIELDS))
+    with _meta_lock:
+        if version == _meta_version:
+            _meta_cache[username] = state
+            _meta_cache.move_to_end(username)
+            if len(_meta_cache) > _meta_cache_limit:
+                _meta_cache.popitem(last=False)
+    return state
+
+
+# Helpers below run inside the write function that calls them.
+
+def _add_tickets(conn: sqlite3.Connection, username: str, amount: int) -> int:
+    """Add (or with a negative amount, spend) tickets. Returns the new balance."""
     row = conn.execute(
-        "SELECT tickets FROM meta_profile WHERE username = ?", (username,)
+        "UPDATE meta_profile SET tickets = tickets + ? WHERE username = ? RETURNING tickets",
+        (amount, username),
     ).fetchone()
     return row[0]
 
 
-def _purchase_unlock(username: str, track_id: str, tier: int, cost: int) -> dict | None:
-    conn = get_db()
-    _ensure_profile(username)
-
-    row = conn.execute(
-        "SELECT tickets FROM meta_profile WHERE username = ?", (username,)
-    ).fetchone()
-    if not row or row[0] < cost:
-        return None
-
-    # Check not already unlocked
-    existing = conn.execute(
-        "SELECT 1 FROM meta_unlocks WHERE username = ? AND track_id = ? AND tier = ?",
-        (username, track_id, tier)
-    ).fetchone()
-    if existing:
-        return None
-
-    conn.execute(
-        "UPDATE meta_profile SET tickets = tickets - ? WHERE username = ?",
-        (cost, username),
-    )
-    conn.execute(
-        "INSERT INTO meta_unlocks (username, track_id, tier) VALUES (?, ?, ?)",
-        (username, track_id, tier)
-    )
-    conn.commit()
-    return _get_meta_state(username)
-
-
-def _record_achievement(username: str, achievement_id: str):
-    conn = get_db()
-    conn.execute(
+def _record_achievements(conn: sqlite3.Connection, username: str, achievement_ids: list[str]):
+    conn.executemany(
         "INSERT OR IGNORE INTO meta_achievements (username, achievement_id) VALUES (?, ?)",
-        (username, achievement_id)
+        [(username, achievement_id) for achievement_id in achievement_ids]
     )
-    conn.commit()
 
 
-def _record_run(username: str, run_data: dict):
-    conn = get_db()
-    conn.execute(
+def _record_run(conn: sqlite3.Connection, username: str, run_data: dict) -> dict:
+    """Insert a history row. Returns it as a history entry."""
+    row = conn.execute(
         "INSERT INTO meta_run_history "
         "(username, result, acts_completed, bosses_defeated, macguffin_id, difficulty, "
         "tickets_earned, final_gold, aldric_basic, pip_basic) "
-        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) RETURNING {HISTORY_COLUMNS}",
         (
             username,
             run_data.get("result", "defeat"),
@@ -321,27 +1106,232 @@ def _record_run(username: str, run_data: dict):
             run_data.get("aldricBasic"),
             run_data.get("pipBasic"),
         )
+    ).fetchone()
+    entry = _history_entry(row)
+    _record_stats(conn, username, entry)
+    return entry
+
+
+def _record_stats(conn: sqlite3.Connection, username: str, entry: dict):
+    """Count a finished run into the global and the user's rollups."""
+    win = int(entry["result"] == "victory")
+    scopes = [GLOBAL_STATS] + ([username] if username not in ("", GLOBAL_STATS) else [])
+    values = [("all", "")] + [
+        (name, "" if entry[key] is None else str(entry[key])) for name, (_, key) in _STAT_DIMENSIONS.items()
+    ]
+    conn.executemany(
+        "INSERT INTO meta_run_stats (scope, dimension, value, runs, wins, acts_completed, bosses_defeated) "
+        "VALUES (?, ?, ?, 1, ?, ?, ?) "
+        "ON CONFLICT (scope, dimension, value) DO UPDATE SET "
+        "runs = runs + 1, wins = wins + excluded.wins, "
+        "acts_completed = acts_completed + excluded.acts_completed, "
+        "bosses_defeated = bosses_defeated + excluded.bosses_defeated",
+        [
+            (scope, dimension, value, win, entry["actsCompleted"], entry["bossesDefeated"])
+            for scope in scopes for dimension, value in values
+        ],
     )
-    conn.commit()
+
+
+_STATS_SQL = ("SELECT dimension, value, runs, wins, acts_completed, bosses_defeated "
+              "FROM meta_run_stats WHERE scope = ?")
+
+
+def _get_stats(scope: str) -> dict:
+    """Win rates from the rollup: overall and per value of each dimension."""
+    stats = {"runs": 0, "wins": 0, "winRate": None, **{name: {} for name in _STAT_DIMENSIONS}}
+    for dimension, value, runs, wins, acts, bosses in get_db().execute(_STATS_SQL, (scope,)):
+        summary = {
+            "runs": runs, "wins": wins, "winRate": wins / runs if runs else None,
+            "avgActs": acts / runs if runs else None, "avgBosses": bosses / runs if runs else None,
+        }
+        if dimension == "all":
+            stats.update(summary)
+        elif dimension in stats:
+            stats[dimension][value] = summary
+    return stats
+
+
+def _purchase_unlock(username: str, track_id: str, tier: int, cost: int) -> dict | None:
+    """Spend tickets on an unlock. None if unaffordable or already unlocked."""
+    conn = get_db()
+    _insert_profile(conn, username)
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO meta_unlocks (username, track_id, tier) VALUES (?, ?, ?)",
+        (username, track_id, tier)
+    )
+    row = conn.execute(
+        "UPDATE meta_profile SET tickets = tickets - ? WHERE username = ? AND tickets >= ? "
+        "RETURNING tickets",
+        (cost, username, cost),
+    ).fetchone() if cursor.rowcount else None
+    if row is None:
+        raise _Rollback(None)
+    _after_commit(_remember_profile, username)
+
+    state = _cached_meta(username)
+    if state is None:
+        state = _get_meta_fields(username, tuple(_META_FIELDS))  # our own uncommitted view
+    else:
+        unlocks = {track: list(tiers) for track, tiers in state["unlocks"].items()}
+        unlocks.setdefault(track_id, []).append(tier)
+        state = {**state, "tickets": row[0], "unlocks": unlocks}
+    _after_commit(_invalidate_meta, username, state)
+    return state
 
 
 def _end_run(username: str, body: dict) -> dict:
-    """Record run results, achievements, add tickets, return updated meta state."""
-    _ensure_profile(username)
+    """Record run results, achievements and tickets; return updated meta state."""
+    conn = get_db()
+    achievement_ids = body.get("newAchievements", [])
+    _insert_profile(conn, username)
+    _record_achievements(conn, username, achievement_ids)
+    tickets = _add_tickets(conn, username, max(body.get("ticketsEarned", 0), 0))
+    entry = _record_run(conn, username, body.get("runData", {}))
+    _after_commit(_remember_profile, username)
+
+    # Apply the change to the cached state rather than re-reading it
+    state = _cached_meta(username)
+    if state is None:
+        state = _get_meta_fields(username, tuple(_META_FIELDS))  # our own uncommitted view
+        _after_commit(_invalidate_meta, username, state)
+        return state
+    state = {
+        **state,
+        "tickets": tickets,
+        "achievements": state["achievements"] + [
+            a for a in dict.fromkeys(achievement_ids) if a not in state["achievements"]
+        ],
+        "history": [entry] + state["history"][:HISTORY_LIMIT - 1],
+    }
+    _after_commit(_invalidate_meta, username, state)
+    return state
+
+
+# --- Maintenance ---
+
+def start_maintenance():
+    """Schedule the periodic maintenance job (call from the running event loop, after init_db)."""
+    global _maintenance_handle
+    if WORKER_INDEX not in (None, "0"):
+        return  # worker 0 maintains the shared DB
+    _maintenance_handle = asyncio.get_running_loop().call_later(MAINTENANCE_SECONDS, _start_maintenance)
+
+
+def _start_maintenance():
+    global _maintenance_handle, _maintenance_task
+    _maintenance_handle = None
+    _maintenance_task = asyncio.ensure_future(_maintain())
+
+
+async def _maintain():
+    """One maintenance pass; writes go through the writer like any other."""
+    try:
+        keep = set(_pending_saves) | set(_flushing_saves)
+        expired = await _write(_expire_runs, RUN_RETENTION_DAYS, keep)
+        archived = 0
+        while True:
+            count = await _write(_archive_history, HISTORY_ARCHIVE_DAYS)
+            archived += count
+            if count < ARCHIVE_BATCH:
+                break
+        freed_pages = await _writer.run_alone(_compact_db)
+        logger.info(f"Curtain Call maintenance: {expired} runs expired, {archived} history rows archived, "
+                    f"{freed_pages} pages freed")
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.exception("Curtain Call maintenance failed")
+    if _writer is not None:
+        start_maintenance()
+
+
+_STALE_RUNS_SQL = "SELECT run_id FROM runs WHERE updated_at < datetime('now', ?)"
+_OLD_HISTORY_SQL = (f"SELECT username, {HISTORY_COLUMNS} FROM meta_run_history "
+                    "WHERE completed_at < datetime('now', ?) ORDER BY completed_at LIMIT ?")
+
+
+def _expire_runs(days: float, keep: set[str]) -> int:
+    """Delete runs (and their patches) untouched for `days`, except those in `keep`."""
+    conn = get_db()
+    stale = [
+        (run_id,) for (run_id,) in conn.execute(_STALE_RUNS_SQL, (f"-{days} days",)).fetchall()
+        if run_id not in keep
+    ]
+    conn.executemany("DELETE FROM run_patches WHERE run_id = ?", stale)
+    conn.executemany("DELETE FROM runs WHERE run_id = ?", stale)
+    return len(stale)
 
-    # Record achievements
-    for ach_id in body.get("newAchievements", []):
-        _record_achievement(username, ach_id)
 
-    # Add tickets
-    tickets_earned = body.get("ticketsEarned", 0)
-    if tickets_earned > 0:
-        _add_tickets(username, tickets_earned)
+def _archive_history(days: float) -> int:
+    """Move up to ARCHIVE_BATCH history rows older than `days` into per-user archive chunks."""
+    conn = get_db()
+    rows = conn.execute(_OLD_HISTORY_SQL, (f"-{days} days", ARCHIVE_BATCH)).fetchall()
+
+    # Reads see the same entries afterwards, so cached meta state stays valid
+    by_user: dict[str, list[dict]] = {}
+    for row in rows:
+        by_user.setdefault(row[0], []).append(_history_entry(row[1:]))
+    for username, entries in by_user.items():
+        entries.sort(key=lambda entry: entry["id"], reverse=True)
+        conn.execute(
+            "INSERT INTO meta_run_history_archive (username, first_id, last_id, data) VALUES (?, ?, ?, ?)",
+            (username, entries[-1]["id"], entries[0]["id"], _encode_state(entries)),
+        )
+    conn.executemany("DELETE FROM meta_run_history WHERE id = ?", [(row[1],) for row in rows])
+    return len(rows)
 
-    # Record run history
-    _record_run(username, body.get("runData", {}))
 
-    return _get_meta_state(username)
+def _compact_db() -> int:
+    """Refresh planner stats, return free pages to the OS and truncate the WAL. Returns pages freed."""
+    conn = get_db()
+    conn.execute("PRAGMA optimize")
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.execute("PRAGMA incremental_vacuum").fetchall()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return free_pages
+
+
+# --- Query plan check ---
+
+# The hot queries above, with sample parameters. None of them may sort in a temp
+# B-tree or scan a table; the recent-user lookups walk their index newest first
+# and stop at the first match, so for them a scan of that index is expected.
+_QUERY_PLAN_CHECKS = [
+    ("recent user", _RECENT_RUN_USER_SQL, (), "idx_runs_updated"),
+    ("recent user (history)", _RECENT_HISTORY_USER_SQL, (), "idx_history_named"),
+    ("active run for user", _ACTIVE_RUN_SQL, ("u",), None),
+    ("load run", _LOAD_RUN_SQL, ("r",), None),
+    ("run revision", _RUN_REVISION_SQL, ("r",), None),
+    ("run patches", _RUN_PATCHES_SQL, ("r",), None),
+    ("patch count", _PATCH_COUNT_SQL, ("r",), None),
+    ("meta tickets", _TICKETS_SQL, ("u",), None),
+    ("meta unlocks", _UNLOCKS_SQL, ("u",), None),
+    ("meta achievements", _ACHIEVEMENTS_SQL, ("u",), None),
+    ("meta history", _HISTORY_SQL, ("u", HISTORY_LIMIT), None),
+    ("history page", _HISTORY_PAGE_SQL, ("u", 100, HISTORY_LIMIT), None),
+    ("archived history", _ARCHIVED_HISTORY_SQL, ("u", 100), None),
+    ("stats", _STATS_SQL, ("u",), None),
+    ("expire runs", _STALE_RUNS_SQL, ("-30 days",), None),
+    ("archive history", _OLD_HISTORY_SQL, ("-180 days", ARCHIVE_BATCH), None),
+]
+
+
+def check_query_plans() -> list[str]:
+    """EXPLAIN QUERY PLAN the hot queries; describe any full scan or sort they would do."""
+    conn = get_db()
+    problems = []
+    for name, sql, params, scan_index in _QUERY_PLAN_CHECKS:
+        details = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        for detail in details:
+            # SCAN walks the whole table or index (SEARCH would seek)
+            if "TEMP B-TREE" in detail or (
+                detail.startswith("SCAN ") and (scan_index is None or not detail.endswith(f" INDEX {scan_index}"))
+            ):
+                problems.append(f"{name}: {detail}")
+        if scan_index and not any(detail.endswith(f" INDEX {scan_index}") for detail in details):
+            problems.append(f"{name}: does not use {scan_index}")
+    return problems
 
 
 # --- FastAPI Router ---
@@ -356,22 +1346,51 @@ async def save_run(body: dict):
     username = body.get("username", "")
     if not run_id or state is None:
         return JSONResponse({"error": "run_id and state required"}, status_code=400)
-    await asyncio.to_thread(_save_run, run_id, state, username)
-    return {"status": "ok"}
+    if not _valid_state(state):
+        return JSONResponse({"error": "state and its runState must be objects"}, status_code=400)
+    revision = await _queue_save(run_id, state, username)
+    return {"status": "ok", "revision": revision}
+
+
+@router.post("/save-patch")
+async def save_run_patch(body: dict):
+    """Delta save: ops against base_revision. 409 means send a full /save instead."""
+    run_id = body.get("run_id")
+    base_revision = body.get("base_revision")
+    ops = body.get("ops")
+    username = body.get("username", "")
+    valid_ops = isinstance(ops, list) and all(
+        # Never the root: a patch changes parts of the state, /save replaces it
+        isinstance(op, dict) and op.get("op") in PATCH_OPS and isinstance(op.get("path"), str)
+        and op["path"].startswith("/")
+        for op in ops
+    )
+    if not run_id or not isinstance(base_revision, int) or not valid_ops:
+        return JSONResponse({"error": "run_id, base_revision and ops (below the root path) required"},
+                            status_code=400)
+    try:
+        revision = await _queue_patch(run_id, base_revision, ops, username)
+    except (KeyError, IndexError, ValueError, TypeError):
+        return JSONResponse({"error": "patch does not apply"}, status_code=400)
+    if revision is None:
+        return JSONResponse({"error": "revision mismatch"}, status_code=409)
+    return {"status": "ok", "revision": revision}
 
 
 @router.get("/load/{run_id}")
 async def load_run(run_id: str):
-    result = await asyncio.to_thread(_load_run, run_id)
+    result = await _current_run(run_id)
     if result is None:
         return JSONResponse({"error": "not found"}, status_code=404)
-    return result
+    return result[0]
 
 
 @router.delete("/run/{run_id}")
 async def delete_run(run_id: str):
-    deleted = await asyncio.to_thread(_delete_run, run_id)
-    if not deleted:
+    # The writer runs in order, so this lands after any flush already under way
+    unflushed = [saves.pop(run_id, None) for saves in (_pending_saves, _flushing_saves)]
+    deleted = await _write(_delete_run, run_id)
+    if not deleted and not any(unflushed):
         return JSONResponse({"error": "not found"}, status_code=404)
     return JSONResponse(None, status_code=204)
 
@@ -380,22 +1399,90 @@ async def delete_run(run_id: str):
 
 @router.get("/recent-user")
 async def get_recent_user():
-    result = await asyncio.to_thread(_get_recent_user)
+    # An unflushed save is the most recent activity there is
+    for saves in (_pending_saves, _flushing_saves):
+        for save in reversed(saves.values()):
+            if save.username:
+                return {"username": save.username}
+    result = await _read(_get_recent_user)
     return {"username": result}
 
 
 @router.get("/user-run/{username}")
 async def get_user_run(username: str):
-    result = await asyncio.to_thread(_get_active_run_for_user, username)
+    run_id = _latest_unflushed_run_for_user(username)
+    if run_id:
+        current = await _current_run(run_id)
+        if current is not None:
+            return {"runId": run_id, "state": current[0]}
+    result = await _read(_get_active_run_for_user, username)
     if result is None:
         return {"runId": None, "state": None}
     return result
 
 
 @router.get("/meta/{username}")
-async def get_meta(username: str):
-    result = await asyncio.to_thread(_get_meta_state, username)
-    return result
+async def get_meta(username: str, fields: str | None = None):
+    """Meta state; `fields` (comma separated, e.g. tickets,unlocks) returns only those parts."""
+    wanted = tuple(_META_FIELDS)
+    if fields is not None:
+        wanted = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+        if not wanted or any(name not in _META_FIELDS for name in wanted):
+            return JSONResponse({"error": f"fields must be from {', '.join(_META_FIELDS)}"}, status_code=400)
+
+    state = _cached_meta(username)
+    if state is None:
+        if username not in _known_profiles:
+            await _write(_ensure_profile, username)  # first sight of this user
+        if set(wanted) != set(_META_FIELDS):
+            return await _read(_get_meta_fields, username, wanted)
+        state = await _read(_get_meta_state, username)
+    return state if fields is None else {name: state[name] for name in wanted}
+
+
+@router.get("/history/{username}")
+async def get_history(username: str, cursor: int | None = None, limit: int | None = None,
+                      fmt: str = Query("json", alias="format")):
+    """
+    Run history, newest first, paginated by id: pass a page's next_cursor as `cursor`.
+
+    format=ndjson streams one entry per line instead - every entry older than
+    `cursor`, or the first `limit` of them.
+    """
+    if (cursor is not None and cursor < 1) or (limit is not None and limit < 1) or fmt not in ("json", "ndjson"):
+        return JSONResponse({"error": "cursor and limit must be positive, format json or ndjson"}, status_code=400)
+
+    if fmt == "json":
+        limit = min(limit or HISTORY_LIMIT, HISTORY_PAGE_MAX)
+        page = await _read(_get_history_page, username, cursor, limit + 1)
+        next_cursor = page[limit - 1]["id"] if len(page) > limit else None
+        return {"history": page[:limit], "next_cursor": next_cursor}
+
+    async def stream():
+        before, remaining = cursor, limit
+        while remaining is None or remaining > 0:
+            size = HISTORY_PAGE_MAX if remaining is None else min(remaining, HISTORY_PAGE_MAX)
+            page = await _read(_get_history_page, username, before, size)
+            for entry in page:
+                yield json.dumps(entry) + "\n"
+            if len(page) < size:
+                break
+            before = page[-1]["id"]
+            if remaining is not None:
+                remaining -= len(page)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.get("/stats")
+async def get_global_stats():
+    """Win rates across all players, by MacGuffin, difficulty and basic-card picks."""
+    return await _read(_get_stats, GLOBAL_STATS)
+
+
+@router.get("/stats/{username}")
+async def get_user_stats(username: str):
+    return await _read(_get_stats, username)
 
 
 @router.post("/meta/purchase")
@@ -406,7 +1493,7 @@ async def purchase_unlock(body: dict):
     cost = body.get("cost")
     if not username or not track_id or tier is None or cost is None:
         return JSONResponse({"error": "username, trackId, tier, and cost required"}, status_code=400)
-    result = await asyncio.to_thread(_purchase_unlock, username, track_id, tier, cost)
+    result = await _write(_purchase_unlock, username, track_id, tier, cost)
     if result is None:
         return JSONResponse({"error": "insufficient tickets or already unlocked"}, status_code=400)
     return result
@@ -415,5 +1502,5 @@ async def purchase_unlock(body: dict):
 @router.post("/meta/end-run")
 async def end_run(body: dict):
     username = body.get("username", "")
-    result = await asyncio.to_thread(_end_run, username, body)
+    result = await _write(_end_run, username, body)
     return result
@@ -8,6 +8,12 @@ class GameClient {
         this.ws = null;
         this.instanceId = null;
         this.playerName = null;
+        // Versioned state sync: last full state and its sequence number
+        this.gameState = null;
+        this.stateSeq = 0;
+        this.syncPending = false;
+        // Multi-worker mode: port of the worker that owns our instance
+        this.port = null;
     }
 
     /**
@@ -20,7 +26,7 @@ class GameClient {
         this.instanceId = instanceId;
 
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.host}/ws/game/${this.gameId}`;
+        const wsUrl = `${protocol}//${this.host()}/ws/game/${this.gameId}`;
 
         this.ws = new WebSocket(wsUrl);
 
@@ -28,17 +34,22 @@ class GameClient {
             console.log('WebSocket connected');
 
             if (instanceId) {
-                // Try to rejoin existing game
+                // Try to rejoin existing game; if it's gone, the server
+                // matchmakes us back up with the same opponent
                 this.send({
                     type: 'rejoin',
                     instance_id: instanceId,
-                    player_name: playerName
+                    player_name: playerName,
+                    state_sync: 'delta',
+                    previous_opponent: sessionStorage.getItem(this.opponentKey(instanceId)) || undefined
                 });
             } else {
-                // New join
+                // New join (?invite=CODE in the lobby URL makes it a private match)
                 this.send({
                     type: 'join',
-                    player_name: playerName
+                    player_name: playerName,
+                    state_sync: 'delta',
+                    invite_code: new URLSearchParams(window.location.search).get('invite') || undefined
                 });
             }
         };
@@ -62,6 +73,42 @@ class GameClient {
         };
     }
 
+    /**
+     * Host (and port) to talk to - the owning worker once we've been redirected
+     */
+    host() {
+        return this.port ? `${window.location.hostname}:${this.port}` : window.location.host;
+    }
+
+    /**
+     * URL for an HTTP resource served by the worker running our game (e.g. images)
+     * @param {string} path - Absolute path like /api/images/...
+     */
+    httpUrl(path) {
+        return this.port ? `${window.location.protocol}//${this.host()}${path}` : path;
+    }
+
+    /**
+     * Reconnect to another worker and rejoin our instance there
+     * @param {number} port - The owning worker's port
+     */
+    moveTo(port) {
+        this.port = port;
+        if (this.ws) {
+            this.ws.onclose = null;
+            this.ws.close();
+        }
+        this.connect(this.playerName, this.instanceId);
+    }
+
+    /**
+     * sessionStorage key remembering who we played in an instance
+     * @param {string} instanceId - Game instance ID
+     */
+    opponentKey(instanceId) {
+        return `parlor_${this.gameId}_opponent_${instanceId}`;
+    }
+
     /**
      * Send a message to the server
      * @param {object} message - Message object to send
@@ -97,7 +144,14 @@ class GameClient {
                 // Update URL without reloading
                 const newUrl = `/game/${this.gameId}/${msg.instance_id}`;
                 history.pushState({}, '', newUrl);
+                sessionStorage.setItem(this.opponentKey(msg.instance_id), msg.opponent_name);
                 this.handlers.onMatched?.(msg);
+                if (msg.port) this.moveTo(msg.port);
+                break;
+
+            case 'redirect':
+                this.instanceId = msg.instance_id;
+                this.moveTo(msg.port);
                 break;
 
             case 'rejoined':
@@ -106,9 +160,25 @@ class GameClient {
                 break;
 
             case 'game_state':
+                this.gameState = msg.data;
+                this.stateSeq = msg.seq || 0;
+                this.syncPending = false;
                 this.handlers.onGameState?.(msg.data);
                 break;
 
+            case 'game_state_patch':
+                if (this.syncPending) break;
+                if (!this.gameState || msg.seq !== this.stateSeq + 1) {
+                    // Missed a patch - ask for a full snapshot
+                    this.syncPending = true;
+                    this.send({ type: 'sync_request' });
+                    break;
+                }
+                this.gameState = applyStatePatch(this.gameState, msg.ops);
+                this.stateSeq = msg.seq;
+                this.handlers.onGameState?.(this.gameState);
+                break;
+
             case 'round_result':
                 this.handlers.onRoundResult?.(msg);
                 break;
@@ -141,6 +211,12 @@ class GameClient {
                 this.handlers.onError?.(msg);
                 break;
 
+            case 'game_closed':
+                // Instance was evicted; games without a handler show it as an error
+                if (this.handlers.onGameClosed) this.handlers.onGameClosed(msg);
+                else this.handlers.onError?.(msg);
+                break;
+
             // Event Dash custom messages
             case 'game_configured':
             case 'game_starting':
@@ -170,3 +246,43 @@ class GameClient {
         }
     }
 }
+
+/**
+ * Apply JSON-patch style ops (as produced by games/state_sync.py) in place
+ * @param {object} doc - State to patch
+ * @param {Array} ops - List of {op, path, value}
+ * @returns {object} The patched state
+ */
+function applyStatePatch(doc, ops) {
+    for (const op of ops) {
+        if (op.path === '') {
+            doc = op.value;
+            continue;
+        }
+
+        const segments = op.path.split('/').slice(1)
+            .map(s => s.replace(/~1/g, '/').replace(/~0/g, '~'));
+        let target = doc;
+        for (const segment of segments.slice(0, -1)) {
+            target = target[Array.isArray(target) ? parseInt(segment) : segment];
+        }
+        const last = segments[segments.length - 1];
+
+        if (Array.isArray(target)) {
+            if (op.op === 'remove') {
+                target.splice(parseInt(last), 1);
+            } else if (last === '-') {
+                target.push(op.value);
+            } else if (op.op === 'add') {
+                target.splice(parseInt(last), 0, op.value);
+            } else {
+                target[parseInt(last)] = op.value;
+            }
+        } else if (op.op === 'remove') {
+            delete target[last];
+        } else {
+            target[last] = op.value;
+        }
+    }
+    return doc;
+}
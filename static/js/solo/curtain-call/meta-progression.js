@@ -86,13 +86,16 @@ Object.assign(CurtainCallGame.prototype, {
             return;
         }
         try {
-            const res = await fetch(`/api/curtain-call/meta/${encodeURIComponent(this.username)}`);
+            // History is fetched separately, page by page, when the backstage shows it
+            const res = await fetch(
+                `/api/curtain-call/meta/${encodeURIComponent(this.username)}?fields=tickets,unlocks,achievements`
+            );
             if (!res.ok) {
                 console.warn('Curtain Call: meta load failed', res.status);
                 this.metaState = { tickets: 0, unlocks: {}, achievements: [], history: [] };
                 return;
             }
-            this.metaState = await res.json();
+            this.metaState = { history: [], ...(await res.json()) };
         } catch (err) {
             console.warn('Curtain Call: meta load error', err);
             this.metaState = { tickets: 0, unlocks: {}, achievements: [], history: [] };
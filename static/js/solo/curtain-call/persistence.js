@@ -12,6 +12,46 @@
 
 'use strict';
 
+/**
+ * Ops turning one save payload into another, in the server's patch format
+ * (games/state_sync.py): add/remove/replace with JSON-pointer paths, "/-"
+ * appends to a list that only grew, any other list change replaces it whole.
+ */
+function makeStatePatch(oldValue, newValue, path = '', ops = []) {
+    const escape = key => String(key).replace(/~/g, '~0').replace(/\//g, '~1');
+    const isObject = v => v !== null && typeof v === 'object' && !Array.isArray(v);
+
+    if (isObject(oldValue) && isObject(newValue)) {
+        for (const key of Object.keys(oldValue)) {
+            if (!(key in newValue)) ops.push({ op: 'remove', path: `${path}/${escape(key)}` });
+        }
+        for (const [key, value] of Object.entries(newValue)) {
+            const child = `${path}/${escape(key)}`;
+            if (!(key in oldValue)) ops.push({ op: 'add', path: child, value });
+            else makeStatePatch(oldValue[key], value, child, ops);
+        }
+        return ops;
+    }
+
+    if (Array.isArray(oldValue) && Array.isArray(newValue)) {
+        const n = oldValue.length;
+        if (newValue.length === n) {
+            for (let i = 0; i < n; i++) makeStatePatch(oldValue[i], newValue[i], `${path}/${i}`, ops);
+            return ops;
+        }
+        const same = (a, b) => a === b || JSON.stringify(a) === JSON.stringify(b);
+        if (newValue.length > n && oldValue.every((v, i) => same(v, newValue[i]))) {
+            for (const value of newValue.slice(n)) ops.push({ op: 'add', path: `${path}/-`, value });
+            return ops;
+        }
+        ops.push({ op: 'replace', path, value: newValue });
+        return ops;
+    }
+
+    if (oldValue !== newValue) ops.push({ op: 'replace', path, value: newValue });
+    return ops;
+}
+
 Object.assign(CurtainCallGame.prototype, {
 
     /**
@@ -47,23 +87,59 @@ Object.assign(CurtainCallGame.prototype, {
 
     /**
      * Save the current run to the server. Fire-and-forget.
+     *
+     * After the first full save of a run, only a patch against the last
+     * saved revision is sent. Saves go out one at a time so revisions stay
+     * in order; a 409 (server has a different revision) falls back to a full save.
      */
     saveRun() {
         const runId = localStorage.getItem('curtainCallRunId');
         if (!runId) return;
 
-        const payload = this.getSavePayload();
+        // Plain JSON copy, so later mutations of game state don't leak into the baseline
+        const payload = JSON.parse(JSON.stringify(this.getSavePayload()));
+        const username = this.username || '';
+
+        this._saveChain = (this._saveChain || Promise.resolve())
+            .then(() => this._sendSave(runId, payload, username))
+            .catch(err => {
+                this._lastSaved = null;
+                console.warn('Curtain Call: save error', err);
+            });
+    },
 
-        fetch('/api/curtain-call/save', {
+    async _sendSave(runId, payload, username) {
+        const last = this._lastSaved;
+        if (last && last.runId === runId) {
+            const ops = makeStatePatch(last.payload, payload);
+            if (!ops.length) return;
+
+            const res = await fetch('/api/curtain-call/save-patch', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ run_id: runId, base_revision: last.revision, ops, username })
+            });
+            if (res.ok) {
+                const { revision } = await res.json();
+                this._lastSaved = { runId, revision, payload };
+                return;
+            }
+            console.warn('Curtain Call: patch save rejected, sending full state', res.status);
+        }
+
+        const res = await fetch('/api/curtain-call/save', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ run_id: runId, state: payload, username: this.username || '' })
-        }).then(res => {
-            if (!res.ok) console.warn('Curtain Call: save failed', res.status);
-            else console.log('Curtain Call: run saved');
-        }).catch(err => {
-            console.warn('Curtain Call: save error', err);
+            body: JSON.stringify({ run_id: runId, state: payload, username })
         });
+        if (!res.ok) {
+            this._lastSaved = null;
+            console.warn('Curtain Call: save failed', res.status);
+            return;
+        }
+        const { revision } = await res.json();
+        this._lastSaved = { runId, revision, payload };
+        console.log('Curtain Call: run saved');
     },
 
     /**
@@ -204,6 +280,7 @@ Object.assign(CurtainCallGame.prototype, {
      * Start a new run: generate UUID and store in localStorage.
      */
     startNewRun() {
+        this._lastSaved = null;
         const runId = crypto.randomUUID();
         localStorage.setItem('curtainCallRunId', runId);
         console.log('Curtain Call: new run', runId);
@@ -219,6 +296,7 @@ Object.assign(CurtainCallGame.prototype, {
         fetch(`/api/curtain-call/run/${runId}`, { method: 'DELETE' })
             .catch(() => {});
         localStorage.removeItem('curtainCallRunId');
+        this._lastSaved = null;
     },
 
     /**
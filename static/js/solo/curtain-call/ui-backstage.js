@@ -148,19 +148,41 @@ Object.assign(CurtainCallGame.prototype, {
         body.innerHTML = html;
     },
 
-    renderRunHistory() {
+    async renderRunHistory() {
         const body = document.getElementById('backstage-body');
         if (!body) return;
 
-        const history = this.metaState?.history || [];
+        body.innerHTML = '<div class="history-list"></div>';
+        this._historyCursor = null;
+        await this._loadHistoryPage(body);
+    },
+
+    /**
+     * Append the next page of run history (keyset-paginated by the server).
+     */
+    async _loadHistoryPage(body) {
+        const list = body.querySelector('.history-list');
+        let page = { history: [], next_cursor: null };
+        if (this.username) {
+            const params = new URLSearchParams({ limit: 50 });
+            if (this._historyCursor) params.set('cursor', this._historyCursor);
+            try {
+                const res = await fetch(`/api/curtain-call/history/${encodeURIComponent(this.username)}?${params}`);
+                if (res.ok) page = await res.json();
+                else console.warn('Curtain Call: history load failed', res.status);
+            } catch (err) {
+                console.warn('Curtain Call: history load error', err);
+            }
+        }
+        if (!list.isConnected) return;  // switched tabs meanwhile
 
-        if (history.length === 0) {
+        if (!this._historyCursor && page.history.length === 0) {
             body.innerHTML = '<div class="history-empty">No runs completed yet.</div>';
             return;
         }
 
-        let html = '<div class="history-list">';
-        for (const run of history) {
+        let html = '';
+        for (const run of page.history) {
             const isVictory = run.result === 'victory';
             const diffDef = DIFFICULTY_DEFINITIONS[run.difficulty] || DIFFICULTY_DEFINITIONS[0];
 
@@ -174,9 +196,20 @@ Object.assign(CurtainCallGame.prototype, {
             html += `<div class="history-tickets">🎫 +${run.ticketsEarned}</div>`;
             html += `</div>`;
         }
-        html += '</div>';
-
-        body.innerHTML = html;
+        list.insertAdjacentHTML('beforeend', html);
+
+        body.querySelector('.history-more')?.remove();
+        this._historyCursor = page.next_cursor;
+        if (page.next_cursor) {
+            const more = document.createElement('button');
+            more.className = 'history-more';
+            more.textContent = 'Older runs';
+            more.addEventListener('click', () => {
+                more.disabled = true;
+                this._loadHistoryPage(body);
+            });
+            body.appendChild(more);
+        }
     },
 
     renderDifficultySelect() {
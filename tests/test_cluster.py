@@ -0,0 +1,72 @@
+"""Broker: matches whose instance never gets created put their players back in the queue."""
+
+import asyncio
+import json
+
+from games.cluster import Broker, _encode
+
+
+class _Writer:
+    """Stands in for a worker connection's StreamWriter; records what the broker sends."""
+
+    def __init__(self):
+        self.sent = []
+
+    def write(self, data: bytes) -> None:
+        self.sent.extend(json.loads(line) for line in data.splitlines())
+
+
+async def _connect(broker: Broker, worker: int) -> tuple[asyncio.StreamReader, _Writer, asyncio.Task]:
+    reader, writer = asyncio.StreamReader(), _Writer()
+    reader.feed_data(_encode({"op": "hello", "worker": worker}))
+    task = asyncio.create_task(broker.handle(reader, writer))
+    await asyncio.sleep(0)
+    return reader, writer, task
+
+
+async def _match(broker: Broker, workers: dict) -> tuple[int, str]:
+    """Queue ann on worker 0 and bob on worker 1 and match them. Returns (owner, instance_id)."""
+    for worker, name in ((0, "ann"), (1, "bob")):
+        workers[worker][0].feed_data(_encode({
+            "op": "enqueue", "ticket": f"{worker}:1", "game_id": "rps", "player_name": name,
+        }))
+    await asyncio.sleep(0)
+    await broker.matchmaker._tick("rps")
+    for worker, (_, writer, _) in workers.items():
+        for msg in writer.sent:
+            if msg["op"] == "create":
+                return worker, msg["instance_id"]
+    raise AssertionError("no create sent")
+
+
+def test_timed_out_create_requeues_both_players():
+    async def main():
+        broker = Broker(2)
+        workers = {worker: await _connect(broker, worker) for worker in (0, 1)}
+        _, instance_id = await _match(broker, workers)
+        assert broker.matchmaker.queue_length("rps") == 0
+
+        broker._abandon_create(instance_id)  # what the CREATE_TIMEOUT_SECONDS timer does
+        assert instance_id not in broker._creating
+        assert broker.matchmaker.queue_length("rps") == 2
+
+        # A late "created" is ignored
+        broker._notify_matched(instance_id)
+        assert not any(msg["op"] == "matched" for _, writer, _ in workers.values() for msg in writer.sent)
+
+    asyncio.run(main())
+
+
+def test_owner_disconnect_requeues_the_other_player():
+    async def main():
+        broker = Broker(2)
+        workers = {worker: await _connect(broker, worker) for worker in (0, 1)}
+        owner, instance_id = await _match(broker, workers)
+
+        workers[owner][0].feed_eof()
+        await workers[owner][2]
+        assert instance_id not in broker._creating
+        # The owner's own player went with it
+        assert broker.matchmaker.queue_length("rps") == 1
+
+    asyncio.run(main())
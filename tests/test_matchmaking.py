@@ -0,0 +1,75 @@
+"""Matchmaker: one waiting ticket per player name and game type."""
+
+import asyncio
+
+from games.base import Player
+from games.matchmaking import Matchmaker, Ticket
+
+
+def _ticket(name: str, key: str, game_id: str = "rps", **constraints) -> Ticket:
+    return Ticket(player=Player(name=name, connected=False), game_id=game_id, key=key, **constraints)
+
+
+def _run(test):
+    """Run test(matchmaker, matches) on a loop; ticks are driven by hand."""
+    matches = []
+
+    async def on_match(game_id, first, second):
+        matches.append((first.player.name, second.player.name))
+
+    async def main():
+        await test(Matchmaker(on_match=on_match), matches)
+
+    asyncio.run(main())
+
+
+def test_duplicate_name_is_rejected():
+    async def test(matchmaker, matches):
+        assert matchmaker.enqueue(_ticket("ann", "a1"))
+        assert not matchmaker.enqueue(_ticket("ann", "a2"))
+        assert not matchmaker.enqueue(_ticket("ann", "a3", invite_code="X"))
+        assert matchmaker.enqueue(_ticket("ann", "a4", game_id="image-reveal"))
+        assert matchmaker.queue_length("rps") == 1
+
+        await matchmaker._tick("rps")
+        assert matches == []
+
+    _run(test)
+
+
+def test_name_is_free_again_once_the_ticket_leaves():
+    async def test(matchmaker, matches):
+        assert matchmaker.enqueue(_ticket("ann", "a1"))
+        assert matchmaker.enqueue(_ticket("ann", "a1"))  # re-queueing the same ticket is fine
+        assert matchmaker.cancel("a1")
+        assert matchmaker.enqueue(_ticket("ann", "a2"))
+
+        assert matchmaker.enqueue(_ticket("bob", "b1"))
+        await matchmaker._tick("rps")
+        assert matches == [("ann", "bob")]
+        assert matchmaker.enqueue(_ticket("ann", "a3"))
+
+    _run(test)
+
+
+def test_ticket_cancelled_during_an_earlier_match_is_skipped():
+    async def test(matchmaker, matches):
+        async def slow_match(game_id, first, second):
+            matches.append((first.player.name, second.player.name))
+            if len(matches) == 1:
+                matchmaker.cancel("d1")  # leaves while the first match is being set up
+                await asyncio.sleep(0)
+
+        matchmaker._on_match = slow_match
+        for name in ("ann", "bob", "cat", "dan"):
+            assert matchmaker.enqueue(_ticket(name, f"{name[0]}1"))
+        await matchmaker._tick("rps")
+        assert matches == [("ann", "bob")]
+        assert matchmaker.queue_length("rps") == 1  # cat waits for someone else
+
+        assert matchmaker.enqueue(_ticket("eve", "e1"))
+        await matchmaker._tick("rps")
+        assert matches == [("ann", "bob"), ("cat", "eve")]
+        assert matchmaker.queue_length("rps") == 0
+
+    _run(test)
@@ -0,0 +1,135 @@
+"""Curtain Call persistence with two cluster workers sharing one database."""
+
+import contextlib
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from games.cluster import worker_port
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Launcher run as a script, like `WORKERS=2 python main.py`: it imports persistence
+# before run_cluster() spawns the workers, which re-import it as __mp_main__
+LAUNCHER = """
+import sys
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+import persistence
+from games.cluster import run_cluster
+
+
+@asynccontextmanager
+async def lifespan(app):
+    persistence.init_db()
+    persistence.start_maintenance()
+    yield
+    persistence.close_db()
+
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(persistence.router)
+
+if __name__ == "__main__":
+    run_cluster("launcher:app", int(sys.argv[1]), 2)
+"""
+
+
+def _free_ports(count: int) -> int:
+    """A base port with `count` free ports after it (the workers' own ports)."""
+    for _ in range(50):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            base = s.getsockname()[1]
+        if base + count > 65535:
+            continue
+        try:
+            for port in range(base, base + count + 1):
+                with socket.socket() as s:
+                    s.bind(("127.0.0.1", port))
+        except OSError:
+            continue
+        return base
+    raise RuntimeError("no free port range")
+
+
+def _request(port: int, method: str, path: str, body: dict | None = None) -> tuple[int, dict]:
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/api/curtain-call{path}", method=method,
+        data=None if body is None else json.dumps(body).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read() or "null")
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or "null")
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Own ports of the two workers of a cluster started by run_cluster on a fresh database."""
+    (tmp_path / "launcher.py").write_text(LAUNCHER)
+    base = _free_ports(2)
+    process = subprocess.Popen(
+        [sys.executable, "launcher.py", str(base)], cwd=tmp_path, start_new_session=True,
+        env={**os.environ, "PYTHONPATH": ROOT, "PARLOR_BROKER_SOCKET": str(tmp_path / "broker.sock")},
+    )
+    ports = [worker_port(base, 0), worker_port(base, 1)]
+    try:
+        deadline = time.monotonic() + 30
+        for port in ports:
+            while True:
+                try:
+                    _request(port, "GET", "/recent-user")
+                    break
+                except OSError:
+                    assert process.poll() is None and time.monotonic() < deadline, "cluster did not start"
+                    time.sleep(0.1)
+        yield ports
+    finally:
+        process.send_signal(signal.SIGINT)  # run_cluster stops its workers
+        try:
+            process.wait(timeout=10)
+        finally:
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(process.pid, signal.SIGKILL)  # any worker left behind
+
+
+def test_saves_are_visible_on_the_other_worker(workers):
+    a, b = workers
+    status, saved = _request(a, "POST", "/save", {"run_id": "r1", "state": {"gold": 1}, "username": "ann"})
+    assert status == 200
+    assert _request(b, "GET", "/load/r1") == (200, {"gold": 1})
+    assert _request(b, "GET", "/user-run/ann")[1]["runId"] == "r1"
+
+    patch = {"run_id": "r1", "base_revision": saved["revision"], "ops": [{"op": "replace", "path": "/gold", "value": 2}]}
+    status, patched = _request(b, "POST", "/save-patch", patch)
+    assert status == 200
+    assert _request(a, "GET", "/load/r1") == (200, {"gold": 2})
+    # Worker A has to see B's patch when checking revisions
+    assert _request(a, "POST", "/save-patch", patch)[0] == 409
+    assert _request(a, "POST", "/save-patch", {**patch, "base_revision": patched["revision"]})[0] == 200
+
+
+def test_meta_is_not_stale_on_the_other_worker(workers):
+    a, b = workers
+    assert _request(b, "GET", "/meta/ann")[1]["tickets"] == 0
+    _request(a, "POST", "/meta/end-run", {"username": "ann", "ticketsEarned": 10, "runData": {"result": "victory"}})
+    assert _request(b, "GET", "/meta/ann")[1]["tickets"] == 10
+
+    status, _ = _request(b, "POST", "/meta/purchase", {"username": "ann", "trackId": "t", "tier": 1, "cost": 4})
+    assert status == 200
+    meta = _request(a, "GET", "/meta/ann")[1]
+    assert meta["tickets"] == 6
+    assert meta["unlocks"] == {"t": [1]}
@@ -0,0 +1,56 @@
+"""Hot Curtain Call queries must be served by indexes (see persistence._QUERY_PLAN_CHECKS)."""
+
+import pytest
+
+import persistence
+
+HOT_QUERIES = {
+    "history page", "meta tickets", "meta unlocks", "meta achievements", "meta history",
+    "stats", "run patches", "load run", "active run for user", "recent user", "recent user (history)",
+}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # DB_PATH is relative
+    persistence.init_db()
+    yield persistence.get_db()
+    persistence.close_db()
+
+
+def test_hot_queries_are_checked():
+    assert HOT_QUERIES <= {name for name, *_ in persistence._QUERY_PLAN_CHECKS}
+
+
+def test_checks_run_the_functions_sql():
+    # The same constants the functions execute, not copies of them
+    sql = {name: sql for name, sql, *_ in persistence._QUERY_PLAN_CHECKS}
+    assert sql["meta history"] is persistence._HISTORY_SQL
+    assert sql["recent user"] is persistence._RECENT_RUN_USER_SQL
+    assert persistence.HISTORY_COLUMNS in sql["meta history"]
+
+
+def test_query_plans(db):
+    assert persistence.check_query_plans() == []
+
+
+RECENT_USER_INDEXES = [("recent user", "idx_runs_updated"), ("recent user (history)", "idx_history_named")]
+
+
+@pytest.mark.parametrize("name, index", RECENT_USER_INDEXES)
+def test_recent_user_scans_its_index(db, name, index):
+    sql, params = next((sql, params) for n, sql, params, _ in persistence._QUERY_PLAN_CHECKS if n == name)
+    plan = [row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    assert plan == [f"SCAN {sql.split()[3]} USING COVERING INDEX {index}"]
+
+
+@pytest.mark.parametrize("name, index", RECENT_USER_INDEXES)
+def test_recent_user_without_its_index_is_reported(db, name, index):
+    db.execute(f"DROP INDEX {index}")
+    assert any(problem.startswith(f"{name}:") for problem in persistence.check_query_plans())
+
+
+def test_missing_index_is_reported(db):
+    db.execute("DROP INDEX idx_runs_user_status_updated")
+    problems = persistence.check_query_plans()
+    assert any(problem.startswith("active run for user") for problem in problems)
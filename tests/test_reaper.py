@@ -0,0 +1,25 @@
+"""Reaper: the idle rule only evicts instances someone has left."""
+
+import time
+
+from games.base import Player
+from games.reaper import Reaper
+from games.rps import RockPaperScissors
+
+
+def _game(*connected: bool) -> RockPaperScissors:
+    game = RockPaperScissors("i1")
+    game.players = [Player(name=f"p{i}", connected=c) for i, c in enumerate(connected)]
+    game.last_activity = time.time() - 2 * game.eviction.idle_seconds  # no moves in a long while
+    return game
+
+
+def test_round_with_everyone_connected_is_not_idle():
+    assert Reaper._deadline(_game(True, True)) == (float("inf"), "")
+
+
+def test_idle_rule_applies_once_someone_is_away():
+    game = _game(True, False)
+    when, reason = Reaper._deadline(game)
+    assert reason == "idle"
+    assert when == game.last_activity + game.eviction.idle_seconds